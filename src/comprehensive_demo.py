@@ -150,7 +150,7 @@ def demo_4_cot():
     # バックトラック
     if low_conf:
         print(f"\nStep {low_conf[0].step_id - 1} にバックトラック...")
-        cot.backtrack_to_step(low_conf[0].step_id - 1)
+        cot.truncate_to_step(low_conf[0].step_id - 1)
         print(f"✓ 現在のステップ: {cot.current_step}")
     
     return cot
@@ -9,7 +9,9 @@ sys.path.append('/home/claude/generative_computing')
 
 from system import GenerativeComputingSystem, SkillManager
 from builtin_functions import BuiltInFunction
+from runtime import SlotType
 from typing import Any, Dict
+import re
 
 
 def demo_basic_execution():
@@ -105,13 +107,18 @@ def demo_custom_skill():
     class SentimentAnalysisSkill(BuiltInFunction):
         """感情分析スキル"""
         
+        positive_words = frozenset(['良い', '素晴らしい', '最高', '優れた'])
+        negative_words = frozenset(['悪い', '最悪', '問題', '困難'])
+        # 全感情語を1パターンにまとめ、テキストを1回の走査で語に切り出す（長い語を優先）
+        _word_re = re.compile('|'.join(
+            map(re.escape, sorted(positive_words | negative_words, key=lambda word: (-len(word), word)))
+        ))
+        
         def execute(self, text: str) -> Dict[str, Any]:
             # 簡易的な感情分析（実際はLLMを使用）
-            positive_words = ['良い', '素晴らしい', '最高', '優れた']
-            negative_words = ['悪い', '最悪', '問題', '困難']
-            
-            positive_count = sum(1 for word in positive_words if word in text)
-            negative_count = sum(1 for word in negative_words if word in text)
+            found = set(self._word_re.findall(text))
+            positive_count = len(found & self.positive_words)
+            negative_count = len(found & self.negative_words)
             
             if positive_count > negative_count:
                 sentiment = "positive"
@@ -215,8 +222,6 @@ def demo_memory_management():
     runtime = gc_system.runtime
     
     # 各種スロットを割り当て
-    from runtime import SlotType
-    
     runtime.allocate_slot("ctx_1", SlotType.CONTEXT, "コンテキストデータ1")
     runtime.allocate_slot("ctx_2", SlotType.CONTEXT, "コンテキストデータ2")
     runtime.allocate_slot("work_1", SlotType.INTERMEDIATE, {"step": 1, "data": [1, 2, 3]})
@@ -239,7 +244,7 @@ def demo_memory_management():
     
     # 実行履歴
     print("\n実行履歴:")
-    for action in runtime.execution_history[-5:]:
+    for action in runtime.recent_history(5):
         print(f"  - {action['action']}: {action['details']}")
     
     return gc_system
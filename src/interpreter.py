@@ -5,9 +5,18 @@
 """
 
 from typing import Any, Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
+from collections import deque
 import re
+import sys
+from runtime import SlotType
+
+
+# 複合指示の区切りとなる接続詞。選択肢は列挙順に試されるため、
+# 先頭の 'して' が 'してから' より優先され、順に split していた従来の結果と一致する
+_SEPARATORS = ('して', 'し、', 'する。', 'の後', 'してから', 'したら')
+_SEPARATOR_RE = re.compile('|'.join(map(re.escape, _SEPARATORS)))
 
 
 class TaskType(Enum):
@@ -20,7 +29,8 @@ class TaskType(Enum):
     ORCHESTRATE = "orchestrate"  # 統合
 
 
-@dataclass
+
+@dataclass(slots=True)
 class Task:
     """タスクの表現"""
     task_id: str
@@ -28,7 +38,7 @@ class Task:
     description: str
     input_slots: List[str]
     output_slots: List[str]
-    parameters: Dict[str, Any]
+    parameters: Optional[Dict[str, Any]] = None  # None はパラメータなし（空の辞書を割り当てない）
     dependencies: List[str] = None
     
     def __post_init__(self):
@@ -36,12 +46,16 @@ class Task:
             self.dependencies = []
 
 
-@dataclass
+@dataclass(slots=True)
 class ExecutionPlan:
     """実行計画"""
     plan_id: str
     tasks: List[Task]
     execution_order: List[str]  # task_ids in order
+    task_index: Dict[str, Task] = field(init=False, repr=False, compare=False)  # task_id -> Task
+    
+    def __post_init__(self):
+        self.task_index = {t.task_id: t for t in self.tasks}
 
 
 class NaturalLanguageInterpreter:
@@ -53,36 +67,51 @@ class NaturalLanguageInterpreter:
     
     def __init__(self):
         self.patterns = self._initialize_patterns()
+        self._combined_pattern, self._alternatives = self._combine_patterns(self.patterns)
         
-    def _initialize_patterns(self) -> Dict[str, List[Tuple[str, TaskType]]]:
-        """指示パターンを初期化"""
-        return {
-            "extract": [
-                (r"(.+)から(.+)を抽出", TaskType.EXTRACT),
-                (r"(.+)を見つけて", TaskType.EXTRACT),
-                (r"(.+)の中から(.+)を取り出", TaskType.EXTRACT),
-            ],
-            "transform": [
-                (r"(.+)を(.+)に変換", TaskType.TRANSFORM),
-                (r"(.+)を(.+)する", TaskType.TRANSFORM),
-                (r"(.+)の形式を変更", TaskType.TRANSFORM),
-            ],
-            "analyze": [
-                (r"(.+)を分析", TaskType.ANALYZE),
-                (r"(.+)について考察", TaskType.ANALYZE),
-                (r"(.+)の傾向を調査", TaskType.ANALYZE),
-            ],
-            "generate": [
-                (r"(.+)を生成", TaskType.GENERATE),
-                (r"(.+)を作成", TaskType.GENERATE),
-                (r"(.+)を書く", TaskType.GENERATE),
-            ],
-            "validate": [
-                (r"(.+)を検証", TaskType.VALIDATE),
-                (r"(.+)をチェック", TaskType.VALIDATE),
-                (r"(.+)が正しいか確認", TaskType.VALIDATE),
-            ]
-        }
+    def _initialize_patterns(self) -> List[Tuple[re.Pattern, TaskType]]:
+        """指示パターンを初期化（コンパイル済み、判定順に並べた1本のリスト）"""
+        patterns = [
+            # extract
+            (r"(.+)から(.+)を抽出", TaskType.EXTRACT),
+            (r"(.+)を見つけて", TaskType.EXTRACT),
+            (r"(.+)の中から(.+)を取り出", TaskType.EXTRACT),
+            # transform
+            (r"(.+)を(.+)に変換", TaskType.TRANSFORM),
+            (r"(.+)を(.+)する", TaskType.TRANSFORM),
+            (r"(.+)の形式を変更", TaskType.TRANSFORM),
+            # analyze
+            (r"(.+)を分析", TaskType.ANALYZE),
+            (r"(.+)について考察", TaskType.ANALYZE),
+            (r"(.+)の傾向を調査", TaskType.ANALYZE),
+            # generate
+            (r"(.+)を生成", TaskType.GENERATE),
+            (r"(.+)を作成", TaskType.GENERATE),
+            (r"(.+)を書く", TaskType.GENERATE),
+            # validate
+            (r"(.+)を検証", TaskType.VALIDATE),
+            (r"(.+)をチェック", TaskType.VALIDATE),
+            (r"(.+)が正しいか確認", TaskType.VALIDATE),
+        ]
+        return [(re.compile(pattern), task_type) for pattern, task_type in patterns]
+    
+    def _combine_patterns(
+        self,
+        patterns: List[Tuple[re.Pattern, TaskType]]
+    ) -> Tuple[re.Pattern, Dict[int, Tuple[TaskType, int, int]]]:
+        """
+        全パターンを1つの選択パターンにまとめる
+        
+        各選択肢を捕獲グループで囲み、そのグループ番号 → (タスクタイプ, 元のグループの範囲) を返す。
+        """
+        alternatives = {}
+        group = 0
+        for pattern, task_type in patterns:
+            group += 1
+            alternatives[group] = (task_type, group, group + pattern.groups)
+            group += pattern.groups
+        combined = re.compile('|'.join(f"({pattern.pattern})" for pattern, _ in patterns))
+        return combined, alternatives
     
     def parse_instruction(self, instruction: str) -> List[Task]:
         """
@@ -107,32 +136,26 @@ class NaturalLanguageInterpreter:
     
     def _split_compound_instruction(self, instruction: str) -> List[str]:
         """複合指示を分解"""
-        # 接続詞で分割
-        separators = ['して', 'し、', 'する。', 'の後', 'してから', 'したら']
-        
-        parts = [instruction]
-        for sep in separators:
-            new_parts = []
-            for part in parts:
-                new_parts.extend(part.split(sep))
-            parts = new_parts
-        
-        return [p.strip() for p in parts if p.strip()]
+        # 接続詞で分割（1回の走査で全区切りを処理）
+        return [p for p in (s.strip() for s in _SEPARATOR_RE.split(instruction)) if p]
     
     def _parse_single_instruction(self, instruction: str, task_id: str) -> Optional[Task]:
         """単一指示をタスクに変換"""
-        for category, patterns in self.patterns.items():
-            for pattern, task_type in patterns:
-                match = re.search(pattern, instruction)
-                if match:
-                    return Task(
-                        task_id=task_id,
-                        task_type=task_type,
-                        description=instruction,
-                        input_slots=[],  # 後で解決
-                        output_slots=[f"{task_id}_output"],
-                        parameters={"matched_groups": match.groups()}
-                    )
+        # ID はセッションを通じて辞書キーとして繰り返し照合されるため intern しておく
+        task_id = sys.intern(task_id)
+        output_slot = sys.intern(f"{task_id}_output")
+        
+        matched = self._match_instruction(instruction)
+        if matched:
+            task_type, groups = matched
+            return Task(
+                task_id=task_id,
+                task_type=task_type,
+                description=instruction,
+                input_slots=[],  # 後で解決
+                output_slots=[output_slot],
+                parameters={"matched_groups": groups}
+            )
         
         # パターンにマッチしない場合は汎用タスク
         return Task(
@@ -140,30 +163,60 @@ class NaturalLanguageInterpreter:
             task_type=TaskType.ORCHESTRATE,
             description=instruction,
             input_slots=[],
-            output_slots=[f"{task_id}_output"],
-            parameters={}
+            output_slots=[output_slot]
         )
     
+    def _match_instruction(self, instruction: str) -> Optional[Tuple[TaskType, Tuple[Any, ...]]]:
+        """最初にマッチするパターンのタスクタイプとグループを返す"""
+        # どのパターンも (.+) で始まるため、1行の指示なら必ず先頭位置でマッチし、
+        # 選択パターンの優先順位が個別パターンを順に試す場合と一致する。
+        # 複数行では位置の早いマッチが優先されて結果が変わるため、個別に判定する
+        if '\n' in instruction:
+            for pattern, task_type in self.patterns:
+                match = pattern.search(instruction)
+                if match:
+                    return task_type, match.groups()
+            return None
+        
+        match = self._combined_pattern.search(instruction)
+        if not match:
+            return None
+        task_type, start, end = self._alternatives[match.lastindex]
+        return task_type, match.groups()[start:end]
+    
     def _resolve_dependencies(self, tasks: List[Task]) -> None:
         """タスク間の依存関係を解決"""
         for i in range(1, len(tasks)):
-            # 前のタスクの出力を現在のタスクの入力とする
-            tasks[i].input_slots = tasks[i-1].output_slots.copy()
+            # 前のタスクの出力を現在のタスクの入力とする（どちらも読み取り専用なのでリストを共有）
+            tasks[i].input_slots = tasks[i-1].output_slots
             tasks[i].dependencies = [tasks[i-1].task_id]
     
     def create_execution_plan(self, tasks: List[Task]) -> ExecutionPlan:
         """実行計画を作成"""
-        # トポロジカルソート（簡易版）
+        # トポロジカルソート（Kahn のアルゴリズム、O(V+E)）
+        in_degree = {task.task_id: 0 for task in tasks}
+        dependents: Dict[str, List[str]] = {task.task_id: [] for task in tasks}
+        for task in tasks:
+            for dep in task.dependencies:
+                if dep not in dependents:
+                    raise ValueError(f"Unknown dependency: {dep} (required by {task.task_id})")
+                dependents[dep].append(task.task_id)
+                in_degree[task.task_id] += 1
+        
+        ready = deque(task_id for task_id, degree in in_degree.items() if degree == 0)
         execution_order = []
-        completed = set()
+        while ready:
+            task_id = ready.popleft()
+            execution_order.append(task_id)
+            for dependent in dependents[task_id]:
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    ready.append(dependent)
         
-        while len(completed) < len(tasks):
-            for task in tasks:
-                if task.task_id not in completed:
-                    # すべての依存関係が完了しているか確認
-                    if all(dep in completed for dep in task.dependencies):
-                        execution_order.append(task.task_id)
-                        completed.add(task.task_id)
+        # 依存が解消されないタスクが残る場合は循環している
+        if len(execution_order) < len(tasks):
+            remaining = [task_id for task_id, degree in in_degree.items() if degree > 0]
+            raise ValueError(f"Circular dependency detected: {', '.join(remaining)}")
         
         return ExecutionPlan(
             plan_id=f"plan_{len(tasks)}",
@@ -173,21 +226,27 @@ class NaturalLanguageInterpreter:
     
     def visualize_plan(self, plan: ExecutionPlan) -> str:
         """実行計画を可視化"""
-        lines = ["=== Execution Plan ==="]
-        lines.append(f"Plan ID: {plan.plan_id}")
-        lines.append(f"Total Tasks: {len(plan.tasks)}")
-        lines.append("\nExecution Order:")
-        
-        task_dict = {t.task_id: t for t in plan.tasks}
+        lines = [
+            "=== Execution Plan ===",
+            f"Plan ID: {plan.plan_id}",
+            f"Total Tasks: {len(plan.tasks)}",
+            "\nExecution Order:",
+        ]
+        append = lines.append
+        task_index = plan.task_index
         
+        # タスクごとに1ブロックの文字列を組み立てて追加
         for idx, task_id in enumerate(plan.execution_order, 1):
-            task = task_dict[task_id]
-            lines.append(f"\n{idx}. {task.task_id} ({task.task_type.value})")
-            lines.append(f"   Description: {task.description}")
-            lines.append(f"   Input Slots: {', '.join(task.input_slots) if task.input_slots else 'None'}")
-            lines.append(f"   Output Slots: {', '.join(task.output_slots)}")
+            task = task_index[task_id]
+            block = (
+                f"\n{idx}. {task.task_id} ({task.task_type.value})\n"
+                f"   Description: {task.description}\n"
+                f"   Input Slots: {', '.join(task.input_slots) if task.input_slots else 'None'}\n"
+                f"   Output Slots: {', '.join(task.output_slots)}"
+            )
             if task.dependencies:
-                lines.append(f"   Dependencies: {', '.join(task.dependencies)}")
+                block += f"\n   Dependencies: {', '.join(task.dependencies)}"
+            append(block)
         
         return "\n".join(lines)
 
@@ -208,14 +267,28 @@ class TaskExecutor:
         self.runtime = runtime
         self.function_library = function_library
         self.execution_results: Dict[str, Any] = {}
+        # よく使う組み込み関数はタスクごとに引かず保持し、登録があれば引き直す
+        self.invalidate_cache()
+        function_library.add_register_callback(self.invalidate_cache)
+        # タスクタイプ → 実行メソッド
+        self._dispatch = {
+            TaskType.EXTRACT: self._execute_extract,
+            TaskType.TRANSFORM: self._execute_transform,
+            TaskType.ANALYZE: self._execute_analyze,
+            TaskType.GENERATE: self._execute_generate,
+            TaskType.VALIDATE: self._execute_validate,
+        }
+    
+    def invalidate_cache(self) -> None:
+        """キャッシュした組み込み関数の参照をライブラリから取り直す"""
+        self._citation = self.function_library.get("citation")
+        self._transform_func = self.function_library.get("transform")
+        self._cot = self.function_library.get("cot")
     
     def execute_plan(self, plan: ExecutionPlan) -> Dict[str, Any]:
         """実行計画を実行"""
-        from runtime import SlotType
-        task_dict = {t.task_id: t for t in plan.tasks}
-        
         for task_id in plan.execution_order:
-            task = task_dict[task_id]
+            task = plan.task_index[task_id]
             result = self._execute_task(task)
             self.execution_results[task_id] = result
             
@@ -236,38 +309,27 @@ class TaskExecutor:
     
     def _execute_task(self, task: Task) -> Any:
         """個別タスクを実行"""
+        input_data = self._get_input_data(task.input_slots)
         # タスクタイプに応じて適切な組み込み関数を呼び出す
-        if task.task_type == TaskType.EXTRACT:
-            return self._execute_extract(task)
-        elif task.task_type == TaskType.TRANSFORM:
-            return self._execute_transform(task)
-        elif task.task_type == TaskType.ANALYZE:
-            return self._execute_analyze(task)
-        elif task.task_type == TaskType.GENERATE:
-            return self._execute_generate(task)
-        elif task.task_type == TaskType.VALIDATE:
-            return self._execute_validate(task)
-        else:
-            return {"status": "not_implemented", "task": task.description}
+        return self._dispatch.get(task.task_type, self._execute_default)(task, input_data)
+    
+    def _execute_default(self, task: Task, input_data: Any) -> Any:
+        """未対応のタスクタイプ"""
+        return {"status": "not_implemented", "task": task.description}
     
-    def _execute_extract(self, task: Task) -> Any:
+    def _execute_extract(self, task: Task, input_data: Any) -> Any:
         """抽出タスクを実行"""
-        # 入力データを取得
-        input_data = self._get_input_data(task.input_slots)
-        
         # 引用抽出器を使用
-        citation_func = self.function_library.get("citation")
+        citation_func = self._citation
         if citation_func and isinstance(input_data, str):
             return citation_func.execute(input_data, verify=False)
         
         return {"extracted": input_data}
     
-    def _execute_transform(self, task: Task) -> Any:
+    def _execute_transform(self, task: Task, input_data: Any) -> Any:
         """変換タスクを実行"""
-        input_data = self._get_input_data(task.input_slots)
-        
         # データ変換パイプラインを使用
-        transform_func = self.function_library.get("transform")
+        transform_func = self._transform_func
         if transform_func:
             # デフォルトのパイプライン
             pipeline = ["strip", "normalize_spaces"]
@@ -275,12 +337,10 @@ class TaskExecutor:
         
         return {"transformed": input_data}
     
-    def _execute_analyze(self, task: Task) -> Any:
+    def _execute_analyze(self, task: Task, input_data: Any) -> Any:
         """分析タスクを実行"""
-        input_data = self._get_input_data(task.input_slots)
-        
         # CoTを使って分析
-        cot = self.function_library.get("cot")
+        cot = self._cot
         if cot:
             cot.add_step(
                 description=f"Analyzing: {task.description}",
@@ -290,16 +350,13 @@ class TaskExecutor:
         
         return {"analysis": "分析完了", "data": input_data}
     
-    def _execute_generate(self, task: Task) -> Any:
+    def _execute_generate(self, task: Task, input_data: Any) -> Any:
         """生成タスクを実行"""
-        input_data = self._get_input_data(task.input_slots)
         return {"generated": f"Generated content based on {input_data}"}
     
-    def _execute_validate(self, task: Task) -> Any:
+    def _execute_validate(self, task: Task, input_data: Any) -> Any:
         """検証タスクを実行"""
-        input_data = self._get_input_data(task.input_slots)
-        
-        citation_func = self.function_library.get("citation")
+        citation_func = self._citation
         if citation_func and isinstance(input_data, dict) and "citations" in input_data:
             results = []
             for citation in input_data["citations"]:
@@ -317,8 +374,5 @@ class TaskExecutor:
             slot = self.runtime.get_slot(slot_ids[0])
             return slot.content if slot else None
         
-        return [
-            self.runtime.get_slot(slot_id).content 
-            for slot_id in slot_ids 
-            if self.runtime.get_slot(slot_id)
-        ]
+        get_slot = self.runtime.get_slot
+        return [slot.content for slot_id in slot_ids if (slot := get_slot(slot_id))]
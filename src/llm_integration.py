@@ -4,23 +4,95 @@
 実際のLLM（Claude API）との統合実装
 """
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+from collections import OrderedDict, deque
+import copy
+import hashlib
 import json
+import math
+import re
+import threading
+import time
+from contextlib import nullcontext
+from itertools import islice
 from abc import ABC, abstractmethod
 
 
+# この件数以上の complete_batch は Message Batches API で投入する
+_BATCH_API_MIN_PROMPTS = 10
+# Message Batches API の完了を待つ既定の上限（秒）
+_BATCH_API_TIMEOUT = 3600.0
+
+# プロンプト・タスク記述の振り分けに使うキーワードとルート（タプルの順が優先順位）
+_ROUTE_KEYWORDS = {
+    "抽出": "extract", "extract": "extract",
+    "分析": "analyze", "analyze": "analyze",
+    "要約": "summarize", "summarize": "summarize",
+    "生成": "generate", "generate": "generate",
+}
+_ROUTES = ("extract", "analyze", "summarize", "generate")
+_ROUTE_RE = re.compile("|".join(map(re.escape, _ROUTE_KEYWORDS)), re.IGNORECASE)
+
+# 応答の行パーサー（[^\S\n] は改行以外の空白で、各行を strip した結果と一致させる）
+# 箇条書き行は記号以降を、それ以外は4文字以上の行をそのまま項目とする
+_ITEM_RE = re.compile(r"^[^\S\n]*(?:[-•][^\S\n]*(.*?)|(\S.{2,}?\S))[^\S\n]*$", re.M)
+# 数字か '-' で始まる行をタスクとし、先頭の番号や記号を除いた部分を取り出す
+_TASK_RE = re.compile(r"^[^\S\n]*(?=[\d-])[0-9.\-) ]*[^\S\n]*(.*?)[^\S\n]*$", re.M)
+# 応答中のマークダウンのコードブロック（閉じる ``` は行末のもの。閉じられていなければ末尾まで）
+_CODE_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*(?:```[^\S\n]*$|\Z)", re.S | re.I | re.M)
+
+
+def _route(text: str, routes: Tuple[str, ...] = _ROUTES) -> Optional[str]:
+    """text に含まれるキーワードのうち、routes の中で最も優先順位の高いルートを返す"""
+    found = {_ROUTE_KEYWORDS[match.group(0).lower()] for match in _ROUTE_RE.finditer(text)}
+    return next((route for route in routes if route in found), None)
+
+
+# LLMEnhancedFunction の固定の指示。呼び出しごとに変わる部分より前（system）に置くことで、
+# プロバイダー側のプレフィックスキャッシュが呼び出し間で効くようにする
+_SYSTEM_PROMPT_EXTRACT = "与えられたテキストから指定された対象を抽出し、抽出した項目をリスト形式で返してください。"
+_SYSTEM_PROMPT_ANALYZE = "与えられたテキストの感情を分析し、分析結果を提供してください。"
+_SYSTEM_PROMPT_SUMMARIZE = "与えられたテキストを、指定された文字数程度で要約してください。"
+_SYSTEM_PROMPT_TRANSFORM = "与えられたデータに指定された変換を行い、変換後のデータを同じ形式で返してください。"
+_SYSTEM_PROMPT_VALIDATE = (
+    "与えられたコンテンツを指定された基準に基づいて検証し、"
+    "各基準について合格/不合格と理由を提供してください。"
+)
+
+
 class LLMProvider(ABC):
-    """LLMプロバイダーの抽象基底クラス"""
+    """
+    LLMプロバイダーの抽象基底クラス
+    
+    complete / complete_stream / complete_batch のキーワード引数はそのままモデルへの
+    リクエストパラメータとして扱う。特に system（システムプロンプト）は必ず反映すること。
+    LLMEnhancedFunction は固定の指示を prompt ではなく system で渡すため、
+    system を無視するとプロンプトに指示が含まれない。
+    """
     
     @abstractmethod
     def complete(self, prompt: str, **kwargs) -> str:
-        """テキスト補完を実行"""
+        """
+        テキスト補完を実行
+        
+        Args:
+            prompt: ユーザープロンプト
+            **kwargs: リクエストパラメータ（system: システムプロンプト、temperature など）
+        """
         pass
     
     @abstractmethod
     def complete_structured(self, prompt: str, schema: Dict) -> Dict:
         """構造化された出力を生成"""
         pass
+    
+    def complete_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """テキスト補完を生成された順に断片で返す（既定では全体を1つの断片として返す。kwargs は complete と同じ）"""
+        yield self.complete(prompt, **kwargs)
+    
+    def complete_batch(self, prompts: List[str], **kwargs) -> List[str]:
+        """複数のプロンプトを補完し、同じ順序で返す（既定では1件ずつ実行。kwargs は complete と同じ）"""
+        return [self.complete(prompt, **kwargs) for prompt in prompts]
 
 
 class MockLLMProvider(LLMProvider):
@@ -30,6 +102,13 @@ class MockLLMProvider(LLMProvider):
     実際のAPI呼び出しなしでテスト可能
     """
     
+    _RESPONSES = {
+        "extract": "抽出結果: 重要な情報1, 重要な情報2, 重要な情報3",
+        "analyze": "分析結果: データには明確なトレンドが見られます。主要な発見は以下の通りです...",
+        "summarize": "要約: 入力テキストの主要なポイントをまとめました。",
+        "generate": "生成結果: 要求された内容に基づいて新しいコンテンツを作成しました。",
+    }
+    
     def __init__(self):
         self.call_count = 0
         self.call_history: List[Dict] = []
@@ -43,17 +122,9 @@ class MockLLMProvider(LLMProvider):
             "type": "complete"
         })
         
-        # シンプルなルールベースの応答
-        if "抽出" in prompt or "extract" in prompt.lower():
-            return "抽出結果: 重要な情報1, 重要な情報2, 重要な情報3"
-        elif "分析" in prompt or "analyze" in prompt.lower():
-            return "分析結果: データには明確なトレンドが見られます。主要な発見は以下の通りです..."
-        elif "要約" in prompt or "summarize" in prompt.lower():
-            return "要約: 入力テキストの主要なポイントをまとめました。"
-        elif "生成" in prompt or "generate" in prompt.lower():
-            return "生成結果: 要求された内容に基づいて新しいコンテンツを作成しました。"
-        else:
-            return "処理完了: タスクを実行しました。"
+        # シンプルなルールベースの応答（system の指示も判定に含める）
+        route = _route(kwargs.get("system", "") + prompt)
+        return self._RESPONSES.get(route, "処理完了: タスクを実行しました。")
     
     def complete_structured(self, prompt: str, schema: Dict) -> Dict:
         """構造化された出力のモック"""
@@ -86,24 +157,130 @@ class ClaudeAPIProvider(LLMProvider):
     実際のAnthropic APIと連携（要API KEY）
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        http2: bool = False,
+        max_retries: int = 6,
+        max_concurrency: Optional[int] = None,
+        http_client: Any = None
+    ):
+        """
+        Args:
+            api_key: Anthropic API キー
+            http2: True の場合、HTTP/2 の接続プールを使う（並行リクエストを
+                1本の接続に多重化する。httpx[http2] が必要）
+            max_retries: レート制限（429）やサーバーエラー（5xx）、接続エラー時の再試行回数。
+                SDK が retry-after ヘッダーを尊重しつつ指数バックオフで再試行する
+            max_concurrency: 同時に送るリクエスト数の上限（None なら制限しない）。
+                スレッドから並列に呼ぶ場合にレート制限へ張り付かないようにする
+            http_client: 共有する httpx.Client（複数のプロバイダーで接続プールと
+                keep-alive を使い回す。指定時は http2 より優先）
+        """
         self.api_key = api_key
         self._client = None
+        self._request_slots = (
+            threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        )
         
         if api_key:
             try:
                 import anthropic
-                self._client = anthropic.Anthropic(api_key=api_key)
             except ImportError:
                 raise ImportError(
                     "anthropic パッケージが必要です: pip install anthropic"
                 )
+            
+            client_options = {}
+            if http_client is not None:
+                client_options["http_client"] = http_client
+            elif http2:
+                client_options["http_client"] = self._create_http2_client()
+            self._client = anthropic.Anthropic(
+                api_key=api_key, max_retries=max_retries, **client_options
+            )
+    
+    @staticmethod
+    def _create_http2_client():
+        """HTTP/2 を有効にした httpx クライアントを作成"""
+        try:
+            import httpx
+            return httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+            )
+        except ImportError:
+            raise ImportError(
+                "HTTP/2 には httpx[http2] パッケージが必要です: pip install 'httpx[http2]'"
+            )
     
     def complete(self, prompt: str, **kwargs) -> str:
         """Claude APIで補完を実行"""
+        client = self._client_or_raise()
+        with self._request_slot():
+            message = client.messages.create(**self._request_params(prompt, kwargs))
+        return message.content[0].text
+    
+    def complete_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """Claude APIのストリーミングで、生成されたテキストを届いた順に返す"""
+        client = self._client_or_raise()
+        with self._request_slot(), client.messages.stream(**self._request_params(prompt, kwargs)) as stream:
+            yield from stream.text_stream
+    
+    def complete_batch(
+        self,
+        prompts: List[str],
+        poll_interval: float = 10.0,
+        timeout: Optional[float] = _BATCH_API_TIMEOUT,
+        **kwargs
+    ) -> List[str]:
+        """
+        複数のプロンプトを補完し、同じ順序で返す
+        
+        一定件数以上は Message Batches API（非同期・低コスト）で投入し、完了までポーリングする。
+        即時性が不要なオフライン処理向け。少数なら通常の補完を順に実行する。
+        
+        Args:
+            prompts: プロンプトのリスト
+            poll_interval: バッチの状態を確認する間隔（秒）
+            timeout: バッチの完了を待つ上限（秒）。超えたらバッチをキャンセルして
+                TimeoutError を送出する（None なら無制限）
+        """
+        if len(prompts) < _BATCH_API_MIN_PROMPTS:
+            return [self.complete(prompt, **kwargs) for prompt in prompts]
+        
+        client = self._client_or_raise()
+        batch = client.messages.batches.create(requests=[
+            {"custom_id": f"prompt_{idx}", "params": self._request_params(prompt, kwargs)}
+            for idx, prompt in enumerate(prompts)
+        ])
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while batch.processing_status != "ended":
+            if deadline is not None and time.monotonic() >= deadline:
+                client.messages.batches.cancel(batch.id)
+                raise TimeoutError(f"バッチ {batch.id} が {timeout} 秒以内に完了しませんでした（キャンセルしました）")
+            time.sleep(poll_interval)
+            batch = client.messages.batches.retrieve(batch.id)
+        
+        texts: Dict[str, str] = {}
+        for entry in client.messages.batches.results(batch.id):
+            if entry.result.type != "succeeded":
+                raise ValueError(f"バッチ内のリクエストが失敗しました: {entry.custom_id} ({entry.result.type})")
+            texts[entry.custom_id] = entry.result.message.content[0].text
+        return [texts[f"prompt_{idx}"] for idx in range(len(prompts))]
+    
+    def _client_or_raise(self):
+        """APIクライアントを取得（未設定ならエラー）"""
         if not self._client:
             raise ValueError("API キーが設定されていません")
-        
+        return self._client
+    
+    def _request_slot(self):
+        """同時リクエスト数の枠を確保するコンテキストマネージャー"""
+        return self._request_slots or nullcontext()
+    
+    def _request_params(self, prompt: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """リクエストのパラメータを組み立て"""
         # デフォルトパラメータ
         params = {
             "model": "claude-sonnet-4-20250514",
@@ -111,16 +288,11 @@ class ClaudeAPIProvider(LLMProvider):
             "temperature": 0.7,
         }
         params.update(kwargs)
-        
-        message = self._client.messages.create(
-            **params,
-            messages=[{
-                "role": "user",
-                "content": prompt
-            }]
-        )
-        
-        return message.content[0].text
+        params["messages"] = [{
+            "role": "user",
+            "content": prompt
+        }]
+        return params
     
     def complete_structured(self, prompt: str, schema: Dict) -> Dict:
         """構造化された出力を生成"""
@@ -136,20 +308,226 @@ IMPORTANT: 応答は有効なJSONのみを含めてください。説明文は
         
         response = self.complete(structured_prompt, temperature=0.3)
         
-        # JSONを抽出
+        # JSONを抽出（応答全体がそのままJSONならコードブロックは探さない）
+        text = response.strip()
         try:
-            # マークダウンのコードブロックを除去
-            clean_response = response.strip()
-            if clean_response.startswith("```"):
-                clean_response = clean_response.split("```")[1]
-                if clean_response.startswith("json"):
-                    clean_response = clean_response[4:]
-            
-            return json.loads(clean_response.strip())
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass
+        
+        try:
+            # マークダウンのコードブロックがあればその中身を使う（前後の説明文は無視）
+            match = _CODE_FENCE_RE.search(response)
+            return json.loads(match.group(1) if match else text)
         except json.JSONDecodeError as e:
             raise ValueError(f"LLMの応答を解析できませんでした: {e}\n応答: {response}")
 
 
+class CachingLLMProvider(LLMProvider):
+    """
+    応答キャッシュ付きLLMプロバイダー
+    
+    別のプロバイダーをラップし、同じプロンプト・パラメータの呼び出しには
+    前回の応答を返す（決定的な応答を前提とするため、明示的にラップした場合のみ有効）
+    """
+    
+    def __init__(self, provider: LLMProvider, max_entries: int = 1024):
+        self.provider = provider
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()  # 並行実行時のキャッシュ操作を保護（LLM呼び出し自体はロック外）
+    
+    def __getattr__(self, name: str) -> Any:
+        # call_count などはラップしたプロバイダーのものを見せる
+        if name == "provider":
+            raise AttributeError(name)
+        return getattr(self.provider, name)
+    
+    def _cache_key(self, method: str, prompt: str, params: Dict[str, Any]) -> str:
+        """呼び出し内容から決定的なキーを作成"""
+        payload = json.dumps(
+            {"method": method, "prompt": prompt, "params": params},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _cached_call(self, key: str, call: Callable[[], Any]) -> Any:
+        """キャッシュを引き、なければ呼び出して保存（LRUで件数を制限）"""
+        cache = self._cache
+        with self._lock:
+            if key in cache:
+                self.hits += 1
+                cache.move_to_end(key)
+                return cache[key]
+            self.misses += 1
+        
+        result = call()
+        self._store(key, result)
+        return result
+    
+    def complete(self, prompt: str, **kwargs) -> str:
+        """キャッシュ付きの補完"""
+        key = self._cache_key("complete", prompt, kwargs)
+        return self._cached_call(key, lambda: self.provider.complete(prompt, **kwargs))
+    
+    def _store(self, key: str, result: Any) -> None:
+        """結果をキャッシュに保存（LRUで件数を制限）"""
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+    
+    def complete_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """キャッシュ付きのストリーミング補完（ヒット時は全体を1つの断片で返し、ミス時は内側のストリームをそのまま流す）"""
+        key = self._cache_key("complete", prompt, kwargs)
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                cached = self._cache[key]
+            else:
+                self.misses += 1
+                cached = None
+        if cached is not None:
+            yield cached
+            return
+        
+        chunks = []
+        for chunk in self.provider.complete_stream(prompt, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        # 最後まで読み切った場合のみ保存（途中で打ち切られた応答は残さない）
+        self._store(key, "".join(chunks))
+    
+    def complete_batch(self, prompts: List[str], **kwargs) -> List[str]:
+        """キャッシュ付きのバッチ補完（キャッシュにないプロンプトだけを内側の complete_batch に渡す）"""
+        keys = [self._cache_key("complete", prompt, kwargs) for prompt in prompts]
+        results: Dict[str, str] = {}
+        missing: Dict[str, str] = {}  # キー -> プロンプト（同じプロンプトは1回だけ問い合わせる）
+        with self._lock:
+            for key, prompt in zip(keys, prompts):
+                if key in self._cache:
+                    self.hits += 1
+                    self._cache.move_to_end(key)
+                    results[key] = self._cache[key]
+                elif key not in missing:
+                    self.misses += 1
+                    missing[key] = prompt
+        
+        if missing:
+            completions = self.provider.complete_batch(list(missing.values()), **kwargs)
+            for key, completion in zip(missing, completions):
+                results[key] = completion
+                self._store(key, completion)
+        return [results[key] for key in keys]
+    
+    def complete_structured(self, prompt: str, schema: Dict) -> Dict:
+        """キャッシュ付きの構造化出力（呼び出し側の変更がキャッシュに及ばないようコピーを返す）"""
+        key = self._cache_key("complete_structured", prompt, {"schema": schema})
+        result = self._cached_call(key, lambda: self.provider.complete_structured(prompt, schema))
+        return copy.deepcopy(result)
+    
+    def clear_cache(self) -> None:
+        """キャッシュと統計をクリア"""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class SemanticCache:
+    """
+    埋め込みベクトルによる近似一致の応答キャッシュ
+    
+    embed（テキスト → 埋め込みベクトル）を渡すと、コサイン類似度が閾値以上の
+    エントリの応答を返す。embed がない場合はプロンプトの完全一致のみでヒットする
+    （文字の重なりのような表層的な類似は意味の一致を保証しないため、近似一致には使わない）
+    """
+    
+    def __init__(
+        self,
+        embed: Optional[Callable[[str], Sequence[float]]] = None,
+        threshold: float = 0.92,
+        max_entries: int = 256
+    ):
+        """
+        Args:
+            embed: プロンプトを埋め込みベクトルに変換する関数（埋め込みモデルの API など）
+            threshold: 近似一致とみなすコサイン類似度の下限
+            max_entries: 保持するエントリ数の上限（古いものから捨てる）
+        """
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # (名前空間, プロンプト) -> 応答。完全一致は埋め込みなしで引く
+        self._exact: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        # (名前空間, 埋め込みベクトル, ノルム, 応答)。古いものから捨てる
+        self._entries: Deque[Tuple[str, List[float], float, Any]] = deque(maxlen=max_entries)
+        # 直前に lookup で計算した埋め込み（続く store で再計算しない）
+        self._last_embedding: Optional[Tuple[str, List[float], float]] = None
+        self._lock = threading.Lock()
+    
+    def _embedding(self, prompt: str) -> Tuple[List[float], float]:
+        """埋め込みベクトルとそのノルムを返す"""
+        with self._lock:
+            last = self._last_embedding
+        if last is not None and last[0] == prompt:
+            return last[1], last[2]
+        
+        vector = list(self.embed(prompt))
+        norm = math.sqrt(sum(value * value for value in vector))
+        with self._lock:
+            self._last_embedding = (prompt, vector, norm)
+        return vector, norm
+    
+    def lookup(self, prompt: str, namespace: str = "") -> Optional[Any]:
+        """完全一致、または最も類似したエントリの応答を返す（閾値未満なら None）"""
+        key = (namespace, prompt)
+        with self._lock:
+            if key in self._exact:
+                self._exact.move_to_end(key)
+                self.hits += 1
+                return self._exact[key]
+            entries = list(self._entries) if self.embed else []
+        
+        best = None
+        if entries:
+            vector, norm = self._embedding(prompt)
+            best_similarity = self.threshold
+            for entry_namespace, entry_vector, entry_norm, response in entries:
+                if entry_namespace != namespace or not norm:
+                    continue
+                dot = sum(a * b for a, b in zip(vector, entry_vector))
+                similarity = dot / (norm * entry_norm)
+                if similarity >= best_similarity:
+                    best, best_similarity = response, similarity
+        
+        with self._lock:
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return best
+    
+    def store(self, prompt: str, response: Any, namespace: str = "") -> None:
+        """応答を登録"""
+        vector = norm = None
+        if self.embed:
+            vector, norm = self._embedding(prompt)
+        
+        with self._lock:
+            self._exact[(namespace, prompt)] = response
+            self._exact.move_to_end((namespace, prompt))
+            if len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+            if norm:
+                self._entries.append((namespace, vector, norm, response))
+
+
 class LLMEnhancedFunction:
     """
     LLMを活用した拡張関数
@@ -157,32 +535,85 @@ class LLMEnhancedFunction:
     組み込み関数にLLMの能力を追加
     """
     
-    def __init__(self, llm_provider: LLMProvider):
+    def __init__(self, llm_provider: LLMProvider, semantic_cache: Optional[SemanticCache] = None):
         self.llm = llm_provider
+        self.semantic_cache = semantic_cache
     
-    def extract_information(self, text: str, target: str) -> List[str]:
-        """LLMを使用して情報を抽出"""
-        prompt = f"""
-以下のテキストから、{target}を抽出してください。
+    def _complete(
+        self,
+        prompt: str,
+        on_token: Optional[Callable[[str], None]] = None,
+        **kwargs
+    ) -> str:
+        """
+        補完を実行（セマンティックキャッシュがあれば一致する応答を再利用）
+        
+        on_token を渡すとストリーミングで実行し、届いた断片ごとに呼び出す。
+        """
+        cache = self.semantic_cache
+        # パラメータが異なる呼び出しの応答は再利用しない
+        namespace = json.dumps(kwargs, sort_keys=True, default=str) if cache else ""
+        if cache:
+            response = cache.lookup(prompt, namespace)
+            if response is not None:
+                if on_token:
+                    on_token(response)
+                return response
+        
+        if on_token:
+            chunks = []
+            for chunk in self.llm.complete_stream(prompt, **kwargs):
+                on_token(chunk)
+                chunks.append(chunk)
+            response = "".join(chunks)
+        else:
+            response = self.llm.complete(prompt, **kwargs)
+        
+        if cache:
+            cache.store(prompt, response, namespace)
+        return response
+    
+    def _complete_batch(self, prompts: List[str], **kwargs) -> List[str]:
+        """複数の補完を1回の complete_batch で実行（セマンティックキャッシュにあるものは除く）"""
+        cache = self.semantic_cache
+        if not cache:
+            return self.llm.complete_batch(prompts, **kwargs)
+        
+        namespace = json.dumps(kwargs, sort_keys=True, default=str)
+        responses = [cache.lookup(prompt, namespace) for prompt in prompts]
+        missing = [idx for idx, response in enumerate(responses) if response is None]
+        if missing:
+            completed = self.llm.complete_batch([prompts[idx] for idx in missing], **kwargs)
+            for idx, response in zip(missing, completed):
+                cache.store(prompts[idx], response, namespace)
+                responses[idx] = response
+        return responses
+    
+    @staticmethod
+    def _extraction_prompt(text: str, target: str) -> str:
+        """抽出用のプロンプトを作成（固定の指示は system で渡す）"""
+        return f"""
+抽出対象: {target}
 
 テキスト:
 {text}
-
-抽出した{target}をリスト形式で返してください。
 """
-        
-        response = self.llm.complete(prompt)
-        
-        # 簡易的なリスト抽出
-        items = []
-        for line in response.split('\n'):
-            line = line.strip()
-            if line.startswith('-') or line.startswith('•'):
-                items.append(line[1:].strip())
-            elif line and len(line) > 3:
-                items.append(line)
-        
-        return items[:10]  # 最大10項目
+
+    @staticmethod
+    def _parse_items(response: str) -> List[str]:
+        """応答から簡易的にリストを抽出（最大10項目）"""
+        return [match[match.lastindex] for match in islice(_ITEM_RE.finditer(response), 10)]
+    
+    def extract_information(self, text: str, target: str) -> List[str]:
+        """LLMを使用して情報を抽出"""
+        response = self._complete(self._extraction_prompt(text, target), system=_SYSTEM_PROMPT_EXTRACT)
+        return self._parse_items(response)
+    
+    def extract_information_batch(self, texts: List[str], target: str) -> List[List[str]]:
+        """複数のテキストから同じ対象を抽出（プロバイダーの complete_batch にまとめて渡す）"""
+        prompts = [self._extraction_prompt(text, target) for text in texts]
+        responses = self._complete_batch(prompts, system=_SYSTEM_PROMPT_EXTRACT)
+        return [self._parse_items(response) for response in responses]
     
     def analyze_sentiment(self, text: str) -> Dict[str, Any]:
         """LLMを使用して感情分析"""
@@ -194,18 +625,16 @@ class LLMEnhancedFunction:
         }
         
         prompt = f"""
-以下のテキストの感情を分析してください:
-
+テキスト:
 {text}
-
-分析結果を提供してください。
 """
         
         try:
-            return self.llm.complete_structured(prompt, schema)
+            # 構造化出力は system を受け取らないため、固定の指示をプロンプトの先頭に置く
+            return self.llm.complete_structured(f"{_SYSTEM_PROMPT_ANALYZE}\n{prompt}", schema)
         except Exception:
             # フォールバック: シンプルな分析
-            response = self.llm.complete(prompt)
+            response = self._complete(prompt, system=_SYSTEM_PROMPT_ANALYZE)
             return {
                 "sentiment": "neutral",
                 "confidence": 0.5,
@@ -213,31 +642,37 @@ class LLMEnhancedFunction:
                 "summary": response[:200]
             }
     
-    def generate_summary(self, text: str, max_length: int = 200) -> str:
-        """LLMを使用して要約を生成"""
+    def generate_summary(
+        self,
+        text: str,
+        max_length: int = 200,
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """LLMを使用して要約を生成（on_token を渡すと生成途中の断片を逐次受け取れる）"""
         prompt = f"""
-以下のテキストを{max_length}文字程度で要約してください:
+文字数: {max_length}
 
+テキスト:
 {text}
 
 要約:
 """
         
-        summary = self.llm.complete(prompt, max_tokens=max_length * 2)
+        summary = self._complete(
+            prompt, on_token, system=_SYSTEM_PROMPT_SUMMARIZE, max_tokens=max_length * 2
+        )
         return summary.strip()
     
     def transform_data(self, data: Any, transformation: str) -> Any:
         """LLMを使用してデータ変換"""
         prompt = f"""
-以下のデータに対して、次の変換を行ってください: {transformation}
+変換: {transformation}
 
 データ:
 {json.dumps(data, ensure_ascii=False, indent=2)}
-
-変換後のデータを同じ形式で返してください。
 """
         
-        response = self.llm.complete(prompt)
+        response = self._complete(prompt, system=_SYSTEM_PROMPT_TRANSFORM)
         
         try:
             return json.loads(response)
@@ -249,18 +684,14 @@ class LLMEnhancedFunction:
         criteria_text = "\n".join(f"- {c}" for c in criteria)
         
         prompt = f"""
-以下のコンテンツを、次の基準に基づいて検証してください:
-
 基準:
 {criteria_text}
 
 コンテンツ:
 {content}
-
-各基準について、合格/不合格と理由を提供してください。
 """
         
-        response = self.llm.complete(prompt)
+        response = self._complete(prompt, system=_SYSTEM_PROMPT_VALIDATE)
         
         return {
             "is_valid": "合格" in response or "valid" in response.lower(),
@@ -276,15 +707,17 @@ class LLMIntegratedSystem:
     生成コンピューティングシステムにLLM機能を追加
     """
     
-    def __init__(self, llm_provider: LLMProvider):
+    def __init__(self, llm_provider: LLMProvider, semantic_cache: Optional[SemanticCache] = None):
         self.llm = llm_provider
-        self.enhanced_functions = LLMEnhancedFunction(llm_provider)
+        self.enhanced_functions = LLMEnhancedFunction(llm_provider, semantic_cache)
     
     def execute_with_llm(
         self,
         instruction: str,
         context: Optional[Dict[str, Any]] = None,
-        use_cot: bool = True
+        use_cot: bool = True,
+        batch: bool = False,
+        max_workers: int = 1
     ) -> Dict[str, Any]:
         """
         LLMを活用した実行
@@ -293,6 +726,10 @@ class LLMIntegratedSystem:
             instruction: 実行する指示
             context: コンテキストデータ
             use_cot: CoT（連鎖思考）を使用するか
+            batch: 全タスクを1回の構造化呼び出しにまとめて実行するか
+                （応答を解析できない場合はタスクごとの実行にフォールバック）
+            max_workers: タスクごとに実行する場合の並行数（LLM呼び出しは I/O 待ちが
+                主なため、2以上でスレッドに分散して同時に発行する）
             
         Returns:
             実行結果
@@ -305,27 +742,31 @@ class LLMIntegratedSystem:
         # LLMを使用してタスクを分解
         task_decomposition = self._decompose_tasks_with_llm(instruction)
         
+        # コンテキストの文字列化は全タスクで共通なので一度だけ行う
+        context_text = str(context)
+        
+        results = None
+        if batch:
+            try:
+                results = self._execute_tasks_batched(task_decomposition, context_text)
+            except ValueError:
+                results = None
+        
         # 各タスクをLLMで実行
-        results = {}
-        for task_id, task_desc in task_decomposition.items():
-            if "抽出" in task_desc or "extract" in task_desc.lower():
-                results[task_id] = self.enhanced_functions.extract_information(
-                    str(context),
-                    "重要な情報"
-                )
-            elif "分析" in task_desc or "analyze" in task_desc.lower():
-                results[task_id] = self.enhanced_functions.analyze_sentiment(
-                    str(context)
-                )
-            elif "要約" in task_desc or "summarize" in task_desc.lower():
-                results[task_id] = self.enhanced_functions.generate_summary(
-                    str(context)
-                )
+        if results is None:
+            task_ids = list(task_decomposition)
+            
+            def run(task_id: str) -> Any:
+                return self._execute_task_with_llm(task_decomposition[task_id], context_text)
+            
+            if max_workers > 1 and len(task_ids) > 1:
+                # logging などを連鎖して読み込むので、使うときだけインポートする
+                from concurrent.futures import ThreadPoolExecutor
+                
+                with ThreadPoolExecutor(max_workers=min(max_workers, len(task_ids))) as pool:
+                    results = dict(zip(task_ids, pool.map(run, task_ids)))
             else:
-                # 汎用的な処理
-                results[task_id] = self.llm.complete(
-                    f"{task_desc}\n\nコンテキスト: {context}"
-                )
+                results = {task_id: run(task_id) for task_id in task_ids}
         
         return {
             "instruction": instruction,
@@ -334,6 +775,53 @@ class LLMIntegratedSystem:
             "llm_calls": getattr(self.llm, 'call_count', 0)
         }
     
+    def _execute_task_with_llm(self, task_desc: str, context_text: str) -> Any:
+        """タスクの内容に応じた拡張関数で1タスクを実行"""
+        route = _route(task_desc, ("extract", "analyze", "summarize"))
+        if route == "extract":
+            return self.enhanced_functions.extract_information(
+                context_text,
+                "重要な情報"
+            )
+        elif route == "analyze":
+            return self.enhanced_functions.analyze_sentiment(
+                context_text
+            )
+        elif route == "summarize":
+            return self.enhanced_functions.generate_summary(
+                context_text
+            )
+        else:
+            # 汎用的な処理
+            return self.llm.complete(
+                f"{task_desc}\n\nコンテキスト: {context_text}"
+            )
+    
+    def _execute_tasks_batched(
+        self,
+        task_decomposition: Dict[str, str],
+        context_text: str
+    ) -> Dict[str, Any]:
+        """全タスクを1回の構造化呼び出しで実行（結果が揃わなければ ValueError）"""
+        prompt = f"""
+以下のタスクをそれぞれコンテキストに対して実行し、タスクIDごとの結果を返してください:
+
+タスク:
+{json.dumps(task_decomposition, ensure_ascii=False, indent=2)}
+
+コンテキスト: {context_text}
+"""
+        schema = {task_id: "string" for task_id in task_decomposition}
+        
+        response = self.llm.complete_structured(prompt, schema)
+        if not isinstance(response, dict):
+            raise ValueError("バッチ応答がJSONオブジェクトではありません")
+        
+        missing = [task_id for task_id in task_decomposition if task_id not in response]
+        if missing:
+            raise ValueError(f"バッチ応答にタスクの結果がありません: {', '.join(missing)}")
+        return {task_id: response[task_id] for task_id in task_decomposition}
+    
     def _decompose_tasks_with_llm(self, instruction: str) -> Dict[str, str]:
         """LLMを使用してタスクを分解"""
         prompt = f"""
@@ -346,18 +834,12 @@ class LLMIntegratedSystem:
         
         response = self.llm.complete(prompt, max_tokens=500)
         
-        # タスクを抽出（簡易パーサー）
-        tasks = {}
-        task_counter = 0
-        
-        for line in response.split('\n'):
-            line = line.strip()
-            if line and (line[0].isdigit() or line.startswith('-')):
-                task_counter += 1
-                # 番号や記号を除去
-                task_text = line.lstrip('0123456789.-) ').strip()
-                if task_text:
-                    tasks[f"task_{task_counter}"] = task_text
+        # タスクを抽出（簡易パーサー）。番号だけの行も連番には数える
+        tasks = {
+            f"task_{i}": task_text
+            for i, task_text in enumerate(_TASK_RE.findall(response), 1)
+            if task_text
+        }
         
         # 最低1つのタスクは必要
         if not tasks:
@@ -368,12 +850,13 @@ class LLMIntegratedSystem:
     def interactive_refinement(
         self,
         initial_result: Any,
-        refinement_instruction: str
+        refinement_instruction: str,
+        on_token: Optional[Callable[[str], None]] = None
     ) -> Any:
         """
         対話的な改善
         
-        結果を見て、LLMに改善を依頼
+        結果を見て、LLMに改善を依頼。on_token を渡すと生成途中の断片を逐次受け取れる
         """
         prompt = f"""
 以下の結果を、次の指示に従って改善してください:
@@ -386,7 +869,14 @@ class LLMIntegratedSystem:
 改善された結果を同じ形式で返してください。
 """
         
-        response = self.llm.complete(prompt)
+        if on_token:
+            chunks = []
+            for chunk in self.llm.complete_stream(prompt):
+                on_token(chunk)
+                chunks.append(chunk)
+            response = "".join(chunks)
+        else:
+            response = self.llm.complete(prompt)
         
         try:
             return json.loads(response)
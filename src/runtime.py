@@ -7,12 +7,22 @@ LLMベースの構造化実行環境を提供します。
 - チェックポイント/バックトラック機能
 """
 
-from typing import Any, Dict, List, Optional, Callable
-from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Callable
+from collections import deque
+from itertools import islice
+from dataclasses import dataclass, field, replace
 from datetime import datetime
 import json
 from enum import Enum
-import copy
+import pickle
+import zlib
+
+
+# チェックポイント圧縮の zlib レベル（復元時の展開速度を優先して低めにする）
+_CHECKPOINT_COMPRESS_LEVEL = 3
+
+# 実行履歴として保持するアクション数の上限（古いものから捨てる）
+_EXECUTION_HISTORY_MAXLEN = 10_000
 
 
 class SlotType(Enum):
@@ -23,33 +33,59 @@ class SlotType(Enum):
     CITATION = "citation"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class MemorySlot:
-    """スロットベースのメモリ管理"""
+    """
+    スロットベースのメモリ管理
+    
+    不変オブジェクトとして扱い、更新時は新しいインスタンスに置き換える。
+    チェックポイントとスロットを共有するため、content も直接変更しないこと。
+    """
     slot_id: str
     slot_type: SlotType
     content: Any
     metadata: Dict[str, Any] = field(default_factory=dict)
     timestamp: datetime = field(default_factory=datetime.now)
+    # slot_type.value のキャッシュ（Enum の .value はプロパティ経由で遅いため）
+    slot_type_value: str = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, "slot_type_value", self.slot_type.value)
     
     def to_dict(self) -> Dict:
         return {
             "slot_id": self.slot_id,
-            "slot_type": self.slot_type.value,
+            "slot_type": self.slot_type_value,
             "content": self.content,
             "metadata": self.metadata,
             "timestamp": self.timestamp.isoformat()
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class Checkpoint:
     """思考チェーンのチェックポイント"""
     checkpoint_id: str
     state: Dict[str, Any]
-    memory_snapshot: List[MemorySlot]
+    memory_snapshot: Dict[str, MemorySlot]
     timestamp: datetime = field(default_factory=datetime.now)
     description: str = ""
+    compressed_snapshot: Optional[bytes] = None  # 圧縮時は memory_snapshot の代わりにこちらを保持
+    
+    def load_snapshot(self) -> Dict[str, MemorySlot]:
+        """スナップショットのスロットを取得（圧縮されていれば展開する）"""
+        if self.compressed_snapshot is None:
+            return self.memory_snapshot
+        return pickle.loads(zlib.decompress(self.compressed_snapshot))
+
+
+@dataclass(slots=True)
+class RuntimeSnapshot:
+    """ランタイム状態の要約（ダッシュボードなど複数の表示で使い回す）"""
+    memory_usage: Dict[str, Any]
+    execution_history_length: int
+    recent_history: List[Dict]
+    recent_slots: List[MemorySlot]
 
 
 class GenerativeRuntime:
@@ -59,10 +95,18 @@ class GenerativeRuntime:
     高度なKVキャッシュ管理とワークフローオーケストレーションを提供
     """
     
-    def __init__(self):
+    def __init__(self, compress_checkpoints: bool = False):
+        """
+        Args:
+            compress_checkpoints: True の場合、チェックポイントのスナップショットを
+                pickle + zlib で圧縮して保持する（メモリを節約し、復元時に展開する）
+        """
+        self.compress_checkpoints = compress_checkpoints
         self.memory_slots: Dict[str, MemorySlot] = {}
+        # タイプ値別のスロットID索引（挿入順を保つため値なしの dict を順序付き集合として使う）
+        self._by_type: Dict[str, Dict[str, None]] = {slot_type.value: {} for slot_type in SlotType}
         self.checkpoints: Dict[str, Checkpoint] = {}
-        self.execution_history: List[Dict] = []
+        self.execution_history: Deque[Dict] = deque(maxlen=_EXECUTION_HISTORY_MAXLEN)
         self.current_workflow: Optional[str] = None
         
     def allocate_slot(
@@ -79,8 +123,12 @@ class GenerativeRuntime:
             content=content,
             metadata=metadata or {}
         )
+        previous = self.memory_slots.get(slot_id)
+        if previous is not None and previous.slot_type != slot_type:
+            del self._by_type[previous.slot_type_value][slot_id]
         self.memory_slots[slot_id] = slot
-        self._log_action("allocate_slot", {"slot_id": slot_id, "type": slot_type.value})
+        self._by_type[slot.slot_type_value][slot_id] = None
+        self._log_action("allocate_slot", {"slot_id": slot_id, "type": slot.slot_type_value})
         return slot
     
     def update_slot(self, slot_id: str, content: Any, merge: bool = False) -> None:
@@ -88,18 +136,19 @@ class GenerativeRuntime:
         if slot_id not in self.memory_slots:
             raise KeyError(f"Slot {slot_id} not found")
         
-        if merge and isinstance(content, dict) and isinstance(self.memory_slots[slot_id].content, dict):
-            self.memory_slots[slot_id].content.update(content)
-        else:
-            self.memory_slots[slot_id].content = content
+        slot = self.memory_slots[slot_id]
+        if merge and isinstance(content, dict) and isinstance(slot.content, dict):
+            # チェックポイントが旧い辞書を共有している可能性があるので新しい辞書を作る
+            content = {**slot.content, **content}
         
-        self.memory_slots[slot_id].timestamp = datetime.now()
+        self.memory_slots[slot_id] = replace(slot, content=content, timestamp=datetime.now())
         self._log_action("update_slot", {"slot_id": slot_id})
     
     def delete_slot(self, slot_id: str) -> None:
         """スロットを削除（KVキャッシュのクリーニング）"""
         if slot_id in self.memory_slots:
-            del self.memory_slots[slot_id]
+            slot = self.memory_slots.pop(slot_id)
+            del self._by_type[slot.slot_type_value][slot_id]
             self._log_action("delete_slot", {"slot_id": slot_id})
     
     def get_slot(self, slot_id: str) -> Optional[MemorySlot]:
@@ -122,11 +171,22 @@ class GenerativeRuntime:
     
     def create_checkpoint(self, checkpoint_id: str, description: str = "") -> Checkpoint:
         """現在の状態のチェックポイントを作成"""
+        # スロットは不変なので、辞書の浅いコピーだけでスナップショットになる
+        slots = dict(self.memory_slots)
+        compressed = None
+        if self.compress_checkpoints:
+            compressed = zlib.compress(
+                pickle.dumps(slots, protocol=pickle.HIGHEST_PROTOCOL),
+                _CHECKPOINT_COMPRESS_LEVEL
+            )
+            slots = {}
+        
         checkpoint = Checkpoint(
             checkpoint_id=checkpoint_id,
             state=self._capture_state(),
-            memory_snapshot=copy.deepcopy(list(self.memory_slots.values())),
-            description=description
+            memory_snapshot=slots,
+            description=description,
+            compressed_snapshot=compressed
         )
         self.checkpoints[checkpoint_id] = checkpoint
         self._log_action("create_checkpoint", {"checkpoint_id": checkpoint_id})
@@ -137,28 +197,45 @@ class GenerativeRuntime:
         if checkpoint_id not in self.checkpoints:
             raise KeyError(f"Checkpoint {checkpoint_id} not found")
         
-        checkpoint = self.checkpoints[checkpoint_id]
-        self.memory_slots = {
-            slot.slot_id: copy.deepcopy(slot) 
-            for slot in checkpoint.memory_snapshot
-        }
+        # 以降の割り当てでスナップショットが変わらないよう辞書だけコピーする
+        self.memory_slots = dict(self.checkpoints[checkpoint_id].load_snapshot())
+        self._rebuild_type_index()
         self._log_action("restore_checkpoint", {"checkpoint_id": checkpoint_id})
     
     def list_slots_by_type(self, slot_type: SlotType) -> List[MemorySlot]:
         """タイプ別にスロットを取得"""
-        return [slot for slot in self.memory_slots.values() if slot.slot_type == slot_type]
+        return [self.memory_slots[slot_id] for slot_id in self._by_type[slot_type.value]]
+    
+    def recent_history(self, n: int = 10) -> List[Dict]:
+        """直近 n 件の実行履歴を古い順に取得（履歴全体は走査しない）"""
+        return list(islice(reversed(self.execution_history), n))[::-1]
+    
+    def snapshot(self, history_n: int = 10, recent_slots_n: int = 3) -> RuntimeSnapshot:
+        """表示用の状態をまとめて取得（直近の履歴・スロットは末尾から必要な件数だけ取り出す）"""
+        return RuntimeSnapshot(
+            memory_usage=self.get_memory_usage(),
+            execution_history_length=len(self.execution_history),
+            recent_history=self.recent_history(history_n),
+            recent_slots=list(islice(reversed(self.memory_slots.values()), recent_slots_n))[::-1]
+        )
     
     def get_memory_usage(self) -> Dict[str, Any]:
         """メモリ使用状況を取得"""
         return {
             "total_slots": len(self.memory_slots),
             "by_type": {
-                slot_type.value: len(self.list_slots_by_type(slot_type))
-                for slot_type in SlotType
+                type_value: len(slot_ids)
+                for type_value, slot_ids in self._by_type.items()
             },
             "checkpoints": len(self.checkpoints)
         }
     
+    def _rebuild_type_index(self) -> None:
+        """memory_slots からタイプ別索引を作り直す"""
+        self._by_type = {slot_type.value: {} for slot_type in SlotType}
+        for slot_id, slot in self.memory_slots.items():
+            self._by_type[slot.slot_type_value][slot_id] = None
+    
     def _capture_state(self) -> Dict[str, Any]:
         """現在の状態をキャプチャ"""
         return {
@@ -190,6 +267,6 @@ class GenerativeRuntime:
                 }
                 for cp_id, cp in self.checkpoints.items()
             },
-            "execution_history": self.execution_history,
+            "execution_history": list(self.execution_history),
             "memory_usage": self.get_memory_usage()
         }
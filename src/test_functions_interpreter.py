@@ -4,9 +4,8 @@
 LLM組み込み関数とインタプリタの機能を検証
 """
 
+import gc
 import unittest
-import sys
-sys.path.append('/home/claude/generative_computing')
 
 from builtin_functions import (
     ChainOfThought, CitationExtractor, DataTransformPipeline,
@@ -15,7 +14,7 @@ from builtin_functions import (
 from interpreter import (
     NaturalLanguageInterpreter, TaskExecutor, Task, TaskType
 )
-from runtime import GenerativeRuntime
+from runtime import GenerativeRuntime, SlotType
 
 
 class TestChainOfThought(unittest.TestCase):
@@ -64,6 +63,20 @@ class TestChainOfThought(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.cot.backtrack_to_step(10)
     
+    def test_truncate_to_step(self):
+        """削除ステップを返さない巻き戻しのテスト"""
+        self.cot.add_step("Step 1", "R1", 0.9)
+        self.cot.add_step("Step 2", "R2", 0.8)
+        chain = self.cot.thought_chain
+        
+        self.assertIsNone(self.cot.truncate_to_step(0))
+        
+        self.assertIs(self.cot.thought_chain, chain)
+        self.assertEqual(len(chain), 1)
+        self.assertEqual(self.cot.current_step, 0)
+        with self.assertRaises(ValueError):
+            self.cot.truncate_to_step(-1)
+    
     def test_get_low_confidence_steps(self):
         """低信頼度ステップの検出テスト"""
         self.cot.add_step("High", "R1", 0.9)
@@ -73,8 +86,7 @@ class TestChainOfThought(unittest.TestCase):
         
         low_conf = self.cot.get_low_confidence_steps(threshold=0.7)
         
-        self.assertEqual(len(low_conf), 2)
-        self.assertTrue(all(s.confidence < 0.7 for s in low_conf))
+        self.assertEqual([s.confidence for s in low_conf], [0.6, 0.5])
     
     def test_visualize(self):
         """可視化のテスト"""
@@ -90,8 +102,10 @@ class TestChainOfThought(unittest.TestCase):
 class TestCitationExtractor(unittest.TestCase):
     """CitationExtractorクラスのテスト"""
     
-    def setUp(self):
-        self.extractor = CitationExtractor()
+    @classmethod
+    def setUpClass(cls):
+        # 状態を持たないので全テストで共有する
+        cls.extractor = CitationExtractor()
     
     def test_extract_academic_citation(self):
         """学術引用の抽出テスト"""
@@ -103,7 +117,7 @@ class TestCitationExtractor(unittest.TestCase):
         self.assertEqual(len(citations), 1)
         self.assertEqual(citations[0]["type"], "academic")
         self.assertEqual(citations[0]["author"], "Smith")
-        self.assertEqual(citations[0]["year"], "2023")
+        self.assertEqual(citations[0]["year"], 2023)
     
     def test_extract_url(self):
         """URL引用の抽出テスト"""
@@ -141,6 +155,39 @@ class TestCitationExtractor(unittest.TestCase):
         self.assertIn("url", types)
         self.assertIn("quote", types)
     
+    def test_extract_positions_on_demand(self):
+        """出現位置は要求したときだけ付与されるか"""
+        text = "前置き [Smith, 2023]"
+        
+        without_positions = self.extractor.extract_citations(text)
+        with_positions = self.extractor.extract_citations(text, include_positions=True)
+        
+        self.assertNotIn("position", without_positions[0])
+        self.assertEqual(with_positions[0]["position"], text.index("["))
+    
+    def test_iter_citations_in_position_order(self):
+        """引用が出現位置順に遅延生成されるか"""
+        text = '"これは十分に長い引用文です" https://example.com [Smith, 2023]'
+        
+        pairs = list(self.extractor.iter_citations(text))
+        
+        self.assertEqual([c["type"] for c, _ in pairs], ["quote", "url", "academic"])
+        self.assertEqual([v["is_valid"] for _, v in pairs], [True, True, True])
+    
+    def test_find_first(self):
+        """条件を満たす最初の引用の取得テスト"""
+        text = "[Smith, 2023] と https://a.example および https://b.example"
+        
+        first_url = self.extractor.find_first(text, lambda c: c["type"] == "url")
+        
+        self.assertEqual(first_url["url"], "https://a.example")
+        self.assertIsNone(self.extractor.find_first(text, lambda c: c["type"] == "quote"))
+    
+    def test_count_citations(self):
+        """引用件数のカウントテスト"""
+        text = "[Smith, 2023] https://example.com"
+        self.assertEqual(self.extractor.count_citations(text), 2)
+    
     def test_verify_citation(self):
         """引用の検証テスト"""
         citation = {
@@ -174,38 +221,35 @@ class TestDataTransformPipeline(unittest.TestCase):
     def setUp(self):
         self.pipeline = DataTransformPipeline()
     
-    def test_uppercase_transform(self):
-        """大文字変換のテスト"""
-        result = self.pipeline.execute("hello", ["uppercase"])
-        self.assertEqual(result, "HELLO")
-    
-    def test_lowercase_transform(self):
-        """小文字変換のテスト"""
-        result = self.pipeline.execute("HELLO", ["lowercase"])
-        self.assertEqual(result, "hello")
-    
-    def test_strip_transform(self):
-        """空白除去のテスト"""
-        result = self.pipeline.execute("  hello  ", ["strip"])
-        self.assertEqual(result, "hello")
-    
-    def test_normalize_spaces(self):
-        """空白正規化のテスト"""
-        result = self.pipeline.execute("hello    world", ["normalize_spaces"])
-        self.assertEqual(result, "hello world")
-    
-    def test_extract_numbers(self):
-        """数値抽出のテスト"""
-        result = self.pipeline.execute("abc 123 def 456", ["extract_numbers"])
-        self.assertEqual(result, [123, 456])
-    
-    def test_multiple_transforms(self):
-        """複数変換のパイプラインテスト"""
-        result = self.pipeline.execute(
-            "  HELLO   WORLD  ",
+    # (入力, 変換のリスト, 期待値)
+    TRANSFORM_CASES = [
+        ("hello", ["uppercase"], "HELLO"),
+        ("HELLO", ["lowercase"], "hello"),
+        ("  hello  ", ["strip"], "hello"),
+        ("hello    world", ["normalize_spaces"], "hello world"),
+        ("abc 123 def 456", ["extract_numbers"], [123, 456]),
+        ("  HELLO   WORLD  ", ["strip", "lowercase", "normalize_spaces"], "hello world"),
+    ]
+    
+    def test_transforms(self):
+        """大文字・小文字・空白除去・空白正規化・数値抽出と、その組み合わせのテスト"""
+        for data, transformations, expected in self.TRANSFORM_CASES:
+            with self.subTest(data=data, transformations=transformations):
+                self.assertEqual(self.pipeline.execute(data, transformations), expected)
+    
+    def test_string_pipeline_passes_non_strings(self):
+        """文字列変換のみのパイプラインで非文字列がそのまま返るか"""
+        data = {"key": "  Value  "}
+        result = self.pipeline.execute(data, ["strip", "uppercase"])
+        self.assertIs(result, data)
+    
+    def test_execute_many(self):
+        """複数データへの一括適用テスト"""
+        result = self.pipeline.execute_many(
+            ["  A  b ", "C", 42],
             ["strip", "lowercase", "normalize_spaces"]
         )
-        self.assertEqual(result, "hello world")
+        self.assertEqual(result, ["a b", "c", 42])
     
     def test_register_custom_transformer(self):
         """カスタム変換器の登録テスト"""
@@ -217,6 +261,33 @@ class TestDataTransformPipeline(unittest.TestCase):
         result = self.pipeline.execute("hello", ["reverse"])
         self.assertEqual(result, "olleh")
     
+    def test_compile_pipeline(self):
+        """パイプライン合成のテスト"""
+        fused = self.pipeline.compile(["strip", "lowercase", "normalize_spaces"])
+        
+        self.assertEqual(fused("  HELLO   WORLD  "), "hello world")
+        self.assertIs(
+            fused,
+            self.pipeline.compile(["strip", "lowercase", "normalize_spaces"])
+        )
+    
+    def test_register_invalidates_compiled(self):
+        """変換器の再登録で合成済みパイプラインが更新されるか"""
+        self.assertEqual(self.pipeline.execute("abc", ["uppercase"]), "ABC")
+        
+        self.pipeline.register_transformer("uppercase", lambda x: x + "!")
+        
+        self.assertEqual(self.pipeline.execute("abc", ["uppercase"]), "abc!")
+    
+    def test_signature_reflects_registered_transformer(self):
+        """変換器の登録がシグネチャに反映されるか"""
+        self.pipeline.get_signature()
+        self.pipeline.register_transformer("reverse", lambda x: x[::-1])
+        
+        signature = self.pipeline.get_signature()
+        
+        self.assertIn("reverse", signature["available_transformers"])
+    
     def test_unknown_transformer(self):
         """未知の変換器でエラー"""
         with self.assertRaises(ValueError):
@@ -253,13 +324,37 @@ class TestContextSummarizer(unittest.TestCase):
         )
         
         self.assertTrue(result.endswith("。..."))
+        self.assertEqual(result, "一つ目の文。二つ目の文。三つ目の文。...")
+    
+    def test_sentence_boundary_without_period(self):
+        """文境界がない場合は切り詰めになるか"""
+        result = self.summarizer.execute(
+            "句点のない長い文章" * 5,
+            max_length=10,
+            strategy="sentence_boundary"
+        )
+        
+        self.assertEqual(result, "句点のない長い文章句...")
+    
+    def test_extract_key_strategy(self):
+        """キーワード抽出戦略のテスト"""
+        text = "前置きの行\nこれは重要な点\n補足の行\n結論として有効\n" + "x" * 100
+        result = self.summarizer.execute(
+            text,
+            max_length=50,
+            strategy="extract_key"
+        )
+        
+        self.assertEqual(result, "これは重要な点\n結論として有効")
 
 
 class TestFunctionLibrary(unittest.TestCase):
     """FunctionLibraryクラスのテスト"""
     
-    def setUp(self):
-        self.library = FunctionLibrary()
+    @classmethod
+    def setUpClass(cls):
+        # 読み取りのみのテストで共有する（登録を伴うテストは個別に作成する）
+        cls.library = FunctionLibrary()
     
     def test_default_functions(self):
         """デフォルト関数の登録テスト"""
@@ -274,11 +369,36 @@ class TestFunctionLibrary(unittest.TestCase):
         self.assertIsNotNone(cot)
         self.assertIsInstance(cot, ChainOfThought)
     
+    def test_execute_registered_function(self):
+        """登録した関数の実行テスト"""
+        library = FunctionLibrary()
+        library.register("transform2", DataTransformPipeline())
+        
+        result = library.execute("transform2", "  hi  ", ["strip"])
+        
+        self.assertEqual(result, "hi")
+    
+    def test_execute_unknown_function(self):
+        """未登録の関数の実行でエラー"""
+        with self.assertRaises(ValueError):
+            self.library.execute("unknown")
+    
     def test_list_functions(self):
         """関数リストの取得テスト"""
         functions = self.library.list_functions()
         self.assertGreater(len(functions), 0)
-        self.assertTrue(all("name" in f for f in functions))
+        for function in functions:
+            self.assertIn("name", function)
+    
+    def test_signature_mutation_does_not_leak(self):
+        """取得したシグネチャを変更しても他の取得結果に影響しないか"""
+        signature = CitationExtractor().get_signature()
+        signature["inputs"] = "changed"
+        signature["params"].append("changed")
+        
+        other = CitationExtractor().get_signature()
+        self.assertNotIn("inputs", other)
+        self.assertNotIn("changed", other["params"])
 
 
 class TestNaturalLanguageInterpreter(unittest.TestCase):
@@ -301,6 +421,25 @@ class TestNaturalLanguageInterpreter(unittest.TestCase):
         self.assertEqual(len(tasks), 1)
         self.assertEqual(tasks[0].task_type, TaskType.TRANSFORM)
     
+    def test_parse_matched_groups(self):
+        """マッチしたパターンのグループだけが取り出されるか"""
+        tasks = self.interpreter.parse_instruction("データを JSON に変換")
+        
+        self.assertEqual(tasks[0].parameters["matched_groups"], ("データ", " JSON "))
+    
+    def test_parse_multiline_instruction(self):
+        """複数行の指示でもパターンの優先順位が保たれるか"""
+        task = self.interpreter._parse_single_instruction("表を作成\n本文から引用を抽出", "task_0")
+        
+        self.assertEqual(task.task_type, TaskType.EXTRACT)
+    
+    def test_unmatched_instruction_has_no_parameters(self):
+        """パターンにマッチしない指示は汎用タスクになりパラメータを持たないか"""
+        tasks = self.interpreter.parse_instruction("こんにちは")
+        
+        self.assertEqual(tasks[0].task_type, TaskType.ORCHESTRATE)
+        self.assertIsNone(tasks[0].parameters)
+    
     def test_parse_compound_instruction(self):
         """複合指示の解析テスト"""
         instruction = "データを抽出して分析し、結果を生成する"
@@ -321,6 +460,28 @@ class TestNaturalLanguageInterpreter(unittest.TestCase):
         self.assertEqual(plan.execution_order[0], "t1")
         self.assertEqual(plan.execution_order[1], "t2")
     
+    def test_create_execution_plan_orders_dependencies(self):
+        """入力順によらず依存先が先に実行されるか"""
+        tasks = [
+            Task("t3", TaskType.GENERATE, "Generate", [], ["t3_out"], {}, ["t1", "t2"]),
+            Task("t2", TaskType.ANALYZE, "Analyze", [], ["t2_out"], {}, ["t1"]),
+            Task("t1", TaskType.EXTRACT, "Extract", [], ["t1_out"], {}),
+        ]
+        
+        plan = self.interpreter.create_execution_plan(tasks)
+        
+        self.assertEqual(plan.execution_order, ["t1", "t2", "t3"])
+    
+    def test_create_execution_plan_detects_cycle(self):
+        """循環依存が無限ループせずエラーになるか"""
+        tasks = [
+            Task("t1", TaskType.EXTRACT, "Extract", [], ["t1_out"], {}, ["t2"]),
+            Task("t2", TaskType.ANALYZE, "Analyze", [], ["t2_out"], {}, ["t1"]),
+        ]
+        
+        with self.assertRaises(ValueError):
+            self.interpreter.create_execution_plan(tasks)
+    
     def test_visualize_plan(self):
         """実行計画の可視化テスト"""
         tasks = [
@@ -355,7 +516,74 @@ class TestTaskExecutor(unittest.TestCase):
         
         self.assertEqual(result["completed_tasks"], 1)
         self.assertIn("t1", result["results"])
+    
+    def test_directly_registered_transformer_is_used(self):
+        """変換関数を直接登録した後は新しい変換で実行されるか"""
+        from interpreter import ExecutionPlan
+        
+        self.runtime.allocate_slot("in1", SlotType.CONTEXT, "  Hi  ")
+        task = Task("t1", TaskType.TRANSFORM, "Transform", ["in1"], ["out1"], {})
+        self.executor.execute_plan(ExecutionPlan("plan_1", [task], ["t1"]))
+        
+        self.library.get("transform").register_transformer("strip", lambda x: "overridden")
+        result = self.executor.execute_plan(ExecutionPlan("plan_2", [task], ["t1"]))
+        
+        self.assertEqual(
+            result["results"]["t1"],
+            self.library.execute("transform", "  Hi  ", ["strip", "normalize_spaces"])
+        )
+    
+    def test_analyze_is_not_cached(self):
+        """副作用のある分析タスクは毎回実行されるか"""
+        from interpreter import ExecutionPlan
+        
+        tasks = [
+            Task("t1", TaskType.ANALYZE, "Analyze", [], ["out1"], {}),
+            Task("t2", TaskType.ANALYZE, "Analyze", [], ["out2"], {}),
+        ]
+        
+        self.executor.execute_plan(ExecutionPlan("plan_1", tasks, ["t1", "t2"]))
+        
+        self.assertEqual(len(self.library.get("cot").thought_chain), 2)
+    
+    def test_get_input_data_skips_missing_slots(self):
+        """複数スロットの入力で存在しないスロットが除外されるか"""
+        self.runtime.allocate_slot("in1", SlotType.CONTEXT, "a")
+        self.runtime.allocate_slot("in2", SlotType.CONTEXT, "b")
+        
+        data = self.executor._get_input_data(["in1", "missing", "in2"])
+        
+        self.assertEqual(data, ["a", "b"])
+    
+    def test_registered_function_replaces_cached_one(self):
+        """登録し直した関数がキャッシュより優先されるか"""
+        from interpreter import ExecutionPlan
+        
+        class StubExtractor(CitationExtractor):
+            def execute(self, text, verify=True):
+                return {"stub": text}
+        
+        self.library.register("citation", StubExtractor())
+        self.runtime.allocate_slot("in1", SlotType.CONTEXT, "本文")
+        tasks = [
+            Task("t1", TaskType.EXTRACT, "Extract", ["in1"], ["out1"], {})
+        ]
+        
+        result = self.executor.execute_plan(ExecutionPlan("plan_1", tasks, ["t1"]))
+        
+        self.assertEqual(result["results"]["t1"], {"stub": "本文"})
+    
+    def test_discarded_executors_are_not_kept_by_library(self):
+        """破棄した実行エンジンの登録コールバックがライブラリに残らないか"""
+        callbacks_before = len(self.library._on_register)
+        for _ in range(100):
+            TaskExecutor(self.runtime, self.library)
+        gc.collect()
+        
+        self.assertEqual(len(self.library._on_register), callbacks_before)
+        self.library.register("citation", CitationExtractor())
+        self.assertIsInstance(self.executor._citation, CitationExtractor)
 
 
 if __name__ == '__main__':
-    unittest.main(verbosity=2)
+    unittest.main()
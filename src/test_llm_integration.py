@@ -0,0 +1,86 @@
+"""
+生成コンピューティング - LLM統合のテストケース
+
+LLMプロバイダーのラッパーの動作を検証
+"""
+
+import unittest
+from typing import Dict, Iterator, List
+
+from llm_integration import CachingLLMProvider, LLMProvider
+
+
+class RecordingProvider(LLMProvider):
+    """呼び出しを記録するテスト用プロバイダー"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def complete(self, prompt: str, **kwargs) -> str:
+        self.calls.append(("complete", prompt))
+        return f"complete:{prompt}"
+    
+    def complete_structured(self, prompt: str, schema: Dict) -> Dict:
+        self.calls.append(("complete_structured", prompt))
+        return {"prompt": prompt}
+    
+    def complete_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        self.calls.append(("complete_stream", prompt))
+        yield "stream:"
+        yield prompt
+    
+    def complete_batch(self, prompts: List[str], **kwargs) -> List[str]:
+        self.calls.append(("complete_batch", list(prompts)))
+        return [f"batch:{prompt}" for prompt in prompts]
+
+
+class TestCachingLLMProvider(unittest.TestCase):
+    """CachingLLMProviderクラスのテスト"""
+    
+    def setUp(self):
+        self.inner = RecordingProvider()
+        self.provider = CachingLLMProvider(self.inner)
+    
+    def test_stream_reaches_inner_provider(self):
+        """ストリーミングが内側のプロバイダーの complete_stream に届くか"""
+        chunks = list(self.provider.complete_stream("a"))
+        
+        self.assertEqual(chunks, ["stream:", "a"])
+        self.assertEqual(self.inner.calls, [("complete_stream", "a")])
+    
+    def test_stream_result_is_cached(self):
+        """読み切ったストリームの結果が再利用されるか"""
+        list(self.provider.complete_stream("a"))
+        
+        self.assertEqual(list(self.provider.complete_stream("a")), ["stream:a"])
+        self.assertEqual(self.provider.complete("a"), "stream:a")
+        self.assertEqual(len(self.inner.calls), 1)
+    
+    def test_batch_reaches_inner_provider(self):
+        """バッチが内側のプロバイダーの complete_batch に届くか"""
+        results = self.provider.complete_batch(["a", "b"])
+        
+        self.assertEqual(results, ["batch:a", "batch:b"])
+        self.assertEqual(self.inner.calls, [("complete_batch", ["a", "b"])])
+    
+    def test_batch_sends_only_misses(self):
+        """キャッシュ済みのプロンプトはバッチに含めないか"""
+        self.provider.complete("a")
+        
+        results = self.provider.complete_batch(["a", "b", "b"])
+        
+        self.assertEqual(results, ["complete:a", "batch:b", "batch:b"])
+        self.assertEqual(self.inner.calls[-1], ("complete_batch", ["b"]))
+        self.assertEqual(self.provider.complete("b"), "batch:b")
+        self.assertEqual(len(self.inner.calls), 2)
+    
+    def test_batch_all_cached(self):
+        """すべてキャッシュ済みなら内側を呼ばないか"""
+        self.provider.complete_batch(["a"])
+        self.provider.complete_batch(["a"])
+        
+        self.assertEqual(len(self.inner.calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,8 +5,6 @@
 """
 
 import unittest
-import sys
-sys.path.append('/home/claude/generative_computing')
 
 from runtime import GenerativeRuntime, MemorySlot, SlotType, Checkpoint
 
@@ -132,6 +130,28 @@ class TestGenerativeRuntime(unittest.TestCase):
         output_slots = self.runtime.list_slots_by_type(SlotType.OUTPUT)
         self.assertEqual(len(output_slots), 1)
     
+    def test_list_slots_by_type_after_delete_and_restore(self):
+        """削除・復元・タイプ変更後もタイプ別取得が正しいか"""
+        self.runtime.allocate_slot("ctx_1", SlotType.CONTEXT, "data1")
+        self.runtime.create_checkpoint("cp_1")
+        self.runtime.allocate_slot("ctx_2", SlotType.CONTEXT, "data2")
+        self.runtime.delete_slot("ctx_1")
+        self.assertEqual(
+            [slot.slot_id for slot in self.runtime.list_slots_by_type(SlotType.CONTEXT)],
+            ["ctx_2"]
+        )
+        
+        self.runtime.allocate_slot("ctx_2", SlotType.OUTPUT, "result")
+        self.assertEqual(self.runtime.get_memory_usage()["by_type"]["context"], 0)
+        self.assertEqual(self.runtime.get_memory_usage()["by_type"]["output"], 1)
+        
+        self.runtime.restore_checkpoint("cp_1")
+        self.assertEqual(
+            [slot.slot_id for slot in self.runtime.list_slots_by_type(SlotType.CONTEXT)],
+            ["ctx_1"]
+        )
+        self.assertEqual(self.runtime.list_slots_by_type(SlotType.OUTPUT), [])
+    
     def test_create_checkpoint(self):
         """チェックポイント作成のテスト"""
         self.runtime.allocate_slot("slot_1", SlotType.CONTEXT, "data")
@@ -162,6 +182,34 @@ class TestGenerativeRuntime(unittest.TestCase):
         self.assertEqual(slot.content, "original")
         self.assertIsNone(self.runtime.get_slot("slot_2"))
     
+    def test_checkpoint_unaffected_by_merge_update(self):
+        """マージ更新がチェックポイント内のスロットに影響しないか"""
+        self.runtime.allocate_slot("slot_1", SlotType.CONTEXT, {"text": "original"})
+        checkpoint = self.runtime.create_checkpoint("cp_1")
+        
+        self.runtime.update_slot("slot_1", {"text": "modified", "extra": 1}, merge=True)
+        
+        self.assertEqual(checkpoint.memory_snapshot["slot_1"].content, {"text": "original"})
+        self.assertEqual(self.runtime.get_slot("slot_1").content, {"text": "modified", "extra": 1})
+        
+        self.runtime.restore_checkpoint("cp_1")
+        self.assertEqual(self.runtime.get_slot("slot_1").content, {"text": "original"})
+    
+    def test_restore_compressed_checkpoint(self):
+        """圧縮したチェックポイントから復元できるか"""
+        runtime = GenerativeRuntime(compress_checkpoints=True)
+        runtime.allocate_slot("slot_1", SlotType.CONTEXT, {"text": "original"})
+        checkpoint = runtime.create_checkpoint("cp_1", "Before change")
+        
+        runtime.update_slot("slot_1", {"text": "modified"}, merge=True)
+        runtime.allocate_slot("slot_2", SlotType.INTERMEDIATE, "new")
+        runtime.restore_checkpoint("cp_1")
+        
+        self.assertIsNotNone(checkpoint.compressed_snapshot)
+        self.assertEqual(runtime.get_slot("slot_1").content, {"text": "original"})
+        self.assertEqual(runtime.get_slot("slot_1").slot_type, SlotType.CONTEXT)
+        self.assertIsNone(runtime.get_slot("slot_2"))
+    
     def test_restore_nonexistent_checkpoint(self):
         """存在しないチェックポイントの復元でエラーが発生するか"""
         with self.assertRaises(KeyError):
@@ -190,6 +238,41 @@ class TestGenerativeRuntime(unittest.TestCase):
         self.assertEqual(self.runtime.execution_history[1]["action"], "update_slot")
         self.assertEqual(self.runtime.execution_history[2]["action"], "delete_slot")
     
+    def test_execution_history_is_bounded(self):
+        """実行履歴が上限件数を超えて増えないか"""
+        maxlen = self.runtime.execution_history.maxlen
+        for i in range(maxlen + 5):
+            self.runtime.allocate_slot(f"slot_{i}", SlotType.INTERMEDIATE, i)
+        
+        self.assertEqual(len(self.runtime.execution_history), maxlen)
+        self.assertEqual(self.runtime.execution_history[0]["details"]["slot_id"], "slot_5")
+    
+    def test_recent_history(self):
+        """直近の実行履歴を古い順に取得できるか"""
+        for i in range(5):
+            self.runtime.allocate_slot(f"slot_{i}", SlotType.INTERMEDIATE, i)
+        
+        recent = self.runtime.recent_history(3)
+        self.assertEqual(
+            [action["details"]["slot_id"] for action in recent],
+            ["slot_2", "slot_3", "slot_4"]
+        )
+        self.assertEqual(len(self.runtime.recent_history(100)), 5)
+    
+    def test_snapshot(self):
+        """スナップショットに使用状況と直近の履歴・スロットがまとまるか"""
+        for i in range(5):
+            self.runtime.allocate_slot(f"slot_{i}", SlotType.INTERMEDIATE, i)
+        
+        snapshot = self.runtime.snapshot(history_n=2, recent_slots_n=3)
+        self.assertEqual(snapshot.memory_usage, self.runtime.get_memory_usage())
+        self.assertEqual(snapshot.execution_history_length, 5)
+        self.assertEqual(snapshot.recent_history, self.runtime.recent_history(2))
+        self.assertEqual(
+            [slot.slot_id for slot in snapshot.recent_slots],
+            ["slot_2", "slot_3", "slot_4"]
+        )
+    
     def test_export_state(self):
         """状態のエクスポートテスト"""
         self.runtime.allocate_slot("slot_1", SlotType.CONTEXT, "data")
@@ -201,6 +284,7 @@ class TestGenerativeRuntime(unittest.TestCase):
         self.assertIn("checkpoints", state)
         self.assertIn("execution_history", state)
         self.assertIn("memory_usage", state)
+        self.assertIsInstance(state["execution_history"], list)
 
 
 class TestRuntimeIntegration(unittest.TestCase):
@@ -240,4 +324,4 @@ class TestRuntimeIntegration(unittest.TestCase):
 
 if __name__ == '__main__':
     # テストスイートを実行
-    unittest.main(verbosity=2)
+    unittest.main()
@@ -9,11 +9,21 @@ sys.path.append('/mnt/user-data/outputs/generative_computing')
 
 from system import GenerativeComputingSystem, SkillManager
 from llm_integration import LLMIntegratedSystem, MockLLMProvider
-from runtime import SlotType
-from typing import Dict, List, Any
+from runtime import Checkpoint, SlotType
+from typing import Dict, List, Any, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 import json
 
 
+def _keyword_key(item: Any) -> Any:
+    """抽出項目を集計用のキーにする（辞書やリストなどハッシュできない項目は JSON 文字列に）"""
+    if isinstance(item, (str, int, float)):
+        return item
+    return json.dumps(item, ensure_ascii=False, sort_keys=True, default=str)
+
+
 class ResearchPaperAnalyzer:
     """
     研究論文分析システム
@@ -21,14 +31,25 @@ class ResearchPaperAnalyzer:
     複数の論文を分析し、比較レポートを生成
     """
     
-    def __init__(self):
-        self.gc = GenerativeComputingSystem()
-        self.llm_system = LLMIntegratedSystem(MockLLMProvider())
+    def __init__(
+        self,
+        gc: Optional[GenerativeComputingSystem] = None,
+        llm_system: Optional[LLMIntegratedSystem] = None
+    ):
+        """
+        Args:
+            gc: 共有するシステム（省略時は新しく作成）
+            llm_system: 共有するLLM統合システム（省略時はモックで新しく作成）
+        """
+        self.gc = gc or GenerativeComputingSystem()
+        self.llm_system = llm_system or LLMIntegratedSystem(MockLLMProvider())
     
     def analyze_papers(
         self,
         papers: List[Dict[str, str]],
-        analysis_type: str = "comprehensive"
+        analysis_type: str = "comprehensive",
+        max_workers: int = 1,
+        batch: bool = False
     ) -> Dict[str, Any]:
         """
         複数の論文を分析
@@ -36,6 +57,9 @@ class ResearchPaperAnalyzer:
         Args:
             papers: 論文のリスト [{"title": ..., "abstract": ...}, ...]
             analysis_type: 分析タイプ (comprehensive/summary/comparison)
+            max_workers: 抽出の並行数（2以上で論文ごとのLLM呼び出しをスレッドから同時に発行する）
+            batch: True の場合、全論文の抽出を1回のバッチ呼び出しにまとめる
+                （プロバイダーのバッチAPIを使う。max_workers より優先）
             
         Returns:
             分析結果
@@ -46,26 +70,36 @@ class ResearchPaperAnalyzer:
         
         # ステップ1: 各論文から重要情報を抽出
         print("ステップ1: 重要情報の抽出...")
-        extracted_data = []
-        for i, paper in enumerate(papers, 1):
-            print(f"  論文 {i}/{len(papers)}: {paper['title'][:50]}...")
-            
-            extraction = self.llm_system.enhanced_functions.extract_information(
-                paper.get('abstract', paper.get('content', '')),
-                "キーワード、手法、結論"
-            )
-            
-            extracted_data.append({
-                "title": paper['title'],
-                "extracted": extraction
-            })
+        # タイトルと本文は一度だけ取り出し、以降のステップで使い回す
+        titles = [paper['title'] for paper in papers]
+        texts = [paper.get('abstract', paper.get('content', '')) for paper in papers]
+        for i, title in enumerate(titles, 1):
+            print(f"  論文 {i}/{len(papers)}: {title[:50]}...")
+        
+        enhanced = self.llm_system.enhanced_functions
+        target = "キーワード、手法、結論"
+        
+        def extract(text: str) -> List[str]:
+            return enhanced.extract_information(text, target)
+        
+        if batch:
+            extractions = enhanced.extract_information_batch(texts, target)
+        elif max_workers > 1 and len(texts) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(texts))) as pool:
+                extractions = list(pool.map(extract, texts))
+        else:
+            extractions = [extract(text) for text in texts]
+        
+        extracted_data = [
+            {"title": title, "extracted": extraction}
+            for title, extraction in zip(titles, extractions)
+        ]
         
         # ステップ2: 引用の検証
         print("\nステップ2: 引用の検証...")
         citation_results = []
-        for data in extracted_data:
-            # 引用を含むテキストをチェック
-            text = str(data)
+        for text in texts:
+            # 引用を含む元のテキストを直接チェック（抽出結果を文字列化して解析し直さない）
             result = self.gc.function_library.execute(
                 "citation",
                 text,
@@ -95,25 +129,15 @@ class ResearchPaperAnalyzer:
     
     def _compare_papers(self, extracted_data: List[Dict]) -> Dict[str, Any]:
         """論文の比較分析"""
-        # 共通キーワードを見つける
-        all_keywords = []
-        for data in extracted_data:
-            all_keywords.extend(data.get('extracted', []))
-        
-        # 頻度分析（簡易版）
-        keyword_freq = {}
-        for keyword in all_keywords:
-            keyword_freq[keyword] = keyword_freq.get(keyword, 0) + 1
-        
-        # トップ5のキーワード
-        top_keywords = sorted(
-            keyword_freq.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:5]
+        # 共通キーワードの頻度分析（簡易版。平坦なリストを作らず直接数える）とトップ5のキーワード
+        keyword_freq = Counter(
+            _keyword_key(item)
+            for item in chain.from_iterable(data.get('extracted', []) for data in extracted_data)
+        )
+        top_keywords = keyword_freq.most_common(5)
         
         return {
-            "total_keywords": len(set(all_keywords)),
+            "total_keywords": len(keyword_freq),
             "top_keywords": [k for k, v in top_keywords],
             "common_themes": top_keywords[:3]
         }
@@ -162,9 +186,18 @@ class BusinessReportGenerator:
     データを分析してビジネスレポートを生成
     """
     
-    def __init__(self):
-        self.gc = GenerativeComputingSystem()
-        self.llm_system = LLMIntegratedSystem(MockLLMProvider())
+    def __init__(
+        self,
+        gc: Optional[GenerativeComputingSystem] = None,
+        llm_system: Optional[LLMIntegratedSystem] = None
+    ):
+        """
+        Args:
+            gc: 共有するシステム（省略時は新しく作成）
+            llm_system: 共有するLLM統合システム（省略時はモックで新しく作成）
+        """
+        self.gc = gc or GenerativeComputingSystem()
+        self.llm_system = llm_system or LLMIntegratedSystem(MockLLMProvider())
     
     def generate_report(
         self,
@@ -243,15 +276,14 @@ class BusinessReportGenerator:
         # データ変換パイプラインを使用
         transform = self.gc.function_library.get("transform")
         
-        processed = {}
-        for key, value in data.items():
-            if isinstance(value, str):
-                processed[key] = transform.execute(
-                    value,
-                    ["strip", "normalize_spaces"]
-                )
-            else:
-                processed[key] = value
+        # 文字列の値だけをまとめて1回のパイプライン呼び出しで変換する
+        processed = dict(data)
+        str_keys = [key for key, value in data.items() if isinstance(value, str)]
+        cleaned = transform.execute_many(
+            [data[key] for key in str_keys],
+            ["strip", "normalize_spaces"]
+        )
+        processed.update(zip(str_keys, cleaned))
         
         return processed
     
@@ -334,18 +366,28 @@ class DataPipelineOrchestrator:
     複雑なデータ処理ワークフローを管理
     """
     
-    def __init__(self):
-        self.gc = GenerativeComputingSystem()
+    def __init__(self, gc: Optional[GenerativeComputingSystem] = None):
+        """
+        Args:
+            gc: 共有するシステム（省略時は新しく作成）
+        """
+        self.gc = gc or GenerativeComputingSystem()
     
     def execute_pipeline(
         self,
-        pipeline_config: Dict[str, Any]
+        pipeline_config: Dict[str, Any],
+        max_workers: int = 1
     ) -> Dict[str, Any]:
         """
         データパイプラインを実行
         
+        ステージに depends_on（ステージ名のリスト）を指定すると依存関係の DAG として扱い、
+        互いに依存しないステージを同じレベルでまとめて実行する。
+        指定がないステージは直前のステージに依存する（従来どおりの直列実行）。
+        
         Args:
             pipeline_config: パイプライン設定
+            max_workers: 1 より大きい場合、同じレベルのステージをスレッドで並列実行する
             
         Returns:
             実行結果
@@ -356,6 +398,7 @@ class DataPipelineOrchestrator:
         
         stages = pipeline_config.get("stages", [])
         input_data = pipeline_config.get("input_data", {})
+        dependencies = self._resolve_dependencies(stages)
         
         # 初期データをスロットに配置
         self.gc.runtime.allocate_slot(
@@ -365,42 +408,31 @@ class DataPipelineOrchestrator:
         )
         
         results = {}
-        current_data = input_data
+        # ステージ番号 -> 出力（失敗したステージは入力をそのまま流す）
+        outputs: Dict[int, Any] = {}
         
-        # 各ステージを実行
-        for i, stage in enumerate(stages, 1):
-            print(f"ステージ {i}/{len(stages)}: {stage['name']}")
+        for level in self._stage_levels(dependencies):
+            inputs = {
+                i: self._stage_input(stages, dependencies[i], outputs, input_data)
+                for i in level
+            }
             
-            # チェックポイントを作成
-            checkpoint = self.gc.runtime.create_checkpoint(
-                f"stage_{i}_start",
-                f"ステージ {i} 開始前"
-            )
+            if max_workers > 1 and len(level) > 1:
+                self._execute_level_parallel(stages, level, inputs, results, outputs, max_workers)
+                continue
             
-            try:
-                # ステージを実行
-                stage_result = self._execute_stage(stage, current_data)
-                
-                # 結果を保存
-                results[stage['name']] = stage_result
-                current_data = stage_result
-                
-                # スロットに保存
-                self.gc.runtime.allocate_slot(
-                    f"stage_{i}_output",
-                    SlotType.INTERMEDIATE,
-                    stage_result
-                )
-                
-                print(f"  ✓ 完了")
-                
-            except Exception as e:
-                print(f"  ✗ エラー: {e}")
-                print(f"  チェックポイント {checkpoint.checkpoint_id} に復元")
-                self.gc.runtime.restore_checkpoint(checkpoint.checkpoint_id)
-                results[stage['name']] = {"error": str(e)}
-        
-        # 最終結果
+            for i in level:
+                checkpoint = self._begin_stage(stages, i)
+                try:
+                    stage_result = self._execute_stage(stages[i - 1], inputs[i])
+                    self._stage_succeeded(stages, i, stage_result, results, outputs)
+                except Exception as e:
+                    self._stage_failed(stages, i, e, checkpoint, inputs, results, outputs)
+        
+        # 最終結果（他のステージから依存されていない末端ステージの出力。複数あれば名前ごとの辞書）
+        depended = {d for deps in dependencies.values() for d in deps}
+        sinks = [i for i in dependencies if i not in depended]
+        current_data = self._stage_input(stages, sinks, outputs, input_data)
         self.gc.runtime.allocate_slot(
             "pipeline_output",
             SlotType.OUTPUT,
@@ -414,6 +446,130 @@ class DataPipelineOrchestrator:
             "memory_usage": self.gc.runtime.get_memory_usage()
         }
     
+    @staticmethod
+    def _resolve_dependencies(stages: List[Dict[str, Any]]) -> Dict[int, List[int]]:
+        """各ステージ（1始まりの番号）が依存するステージ番号を求める"""
+        index_by_name = {stage["name"]: i for i, stage in enumerate(stages, 1)}
+        dependencies = {}
+        for i, stage in enumerate(stages, 1):
+            if "depends_on" not in stage:
+                dependencies[i] = [i - 1] if i > 1 else []
+                continue
+            
+            unknown = [name for name in stage["depends_on"] if name not in index_by_name]
+            if unknown:
+                raise ValueError(f"ステージ {stage['name']} の依存先が見つかりません: {unknown}")
+            dependencies[i] = [index_by_name[name] for name in stage["depends_on"]]
+        return dependencies
+    
+    @staticmethod
+    def _stage_levels(dependencies: Dict[int, List[int]]) -> List[List[int]]:
+        """依存関係をトポロジカル順のレベルに分ける（各レベル内はステージ番号順）"""
+        remaining = dict(dependencies)
+        done = set()
+        levels = []
+        while remaining:
+            level = [i for i, deps in remaining.items() if done.issuperset(deps)]
+            if not level:
+                raise ValueError(f"ステージの依存関係が循環しています: {sorted(remaining)}")
+            for i in level:
+                del remaining[i]
+            done.update(level)
+            levels.append(level)
+        return levels
+    
+    @staticmethod
+    def _stage_input(
+        stages: List[Dict[str, Any]],
+        deps: List[int],
+        outputs: Dict[int, Any],
+        input_data: Any
+    ) -> Any:
+        """依存先の出力からステージへの入力を組み立てる"""
+        if not deps:
+            return input_data
+        if len(deps) == 1:
+            return outputs[deps[0]]
+        return {stages[d - 1]["name"]: outputs[d] for d in deps}
+    
+    def _begin_stage(self, stages: List[Dict[str, Any]], i: int) -> Checkpoint:
+        """ステージの開始を表示し、開始前のチェックポイントを作成"""
+        print(f"ステージ {i}/{len(stages)}: {stages[i - 1]['name']}")
+        return self.gc.runtime.create_checkpoint(
+            f"stage_{i}_start",
+            f"ステージ {i} 開始前"
+        )
+    
+    def _stage_succeeded(
+        self,
+        stages: List[Dict[str, Any]],
+        i: int,
+        stage_result: Any,
+        results: Dict[str, Any],
+        outputs: Dict[int, Any],
+        label: str = ""
+    ) -> None:
+        """成功したステージの結果を保存"""
+        results[stages[i - 1]['name']] = stage_result
+        outputs[i] = stage_result
+        self.gc.runtime.allocate_slot(
+            f"stage_{i}_output",
+            SlotType.INTERMEDIATE,
+            stage_result
+        )
+        print(f"  ✓ {label}完了")
+    
+    def _stage_failed(
+        self,
+        stages: List[Dict[str, Any]],
+        i: int,
+        error: Exception,
+        checkpoint: Checkpoint,
+        inputs: Dict[int, Any],
+        results: Dict[str, Any],
+        outputs: Dict[int, Any],
+        label: str = ""
+    ) -> None:
+        """失敗したステージを開始前の状態に戻し、入力をそのまま後続へ流す"""
+        print(f"  ✗ {label}エラー: {error}")
+        print(f"  チェックポイント {checkpoint.checkpoint_id} に復元")
+        self.gc.runtime.restore_checkpoint(checkpoint.checkpoint_id)
+        results[stages[i - 1]['name']] = {"error": str(error)}
+        outputs[i] = inputs[i]
+    
+    def _execute_level_parallel(
+        self,
+        stages: List[Dict[str, Any]],
+        level: List[int],
+        inputs: Dict[int, Any],
+        results: Dict[str, Any],
+        outputs: Dict[int, Any],
+        max_workers: int
+    ) -> None:
+        """
+        同じレベルのステージをスレッドで並列実行
+        
+        進捗表示とチェックポイント作成は実行前にまとめて行う（チェックポイントはすべてレベル開始前の状態）。
+        失敗時の復元で他のステージの出力が消えないよう、成功したステージの出力は復元の後に書き込む。
+        """
+        checkpoints = {i: self._begin_stage(stages, i) for i in level}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(level))) as executor:
+            futures = {
+                i: executor.submit(self._execute_stage, stages[i - 1], inputs[i])
+                for i in level
+            }
+        
+        # 結果の表示はまとめて行うため、どのステージの結果かを添える
+        labels = {i: f"{stages[i - 1]['name']}: " for i in level}
+        succeeded = []
+        for i in level:
+            try:
+                succeeded.append((i, futures[i].result()))
+            except Exception as e:
+                self._stage_failed(stages, i, e, checkpoints[i], inputs, results, outputs, labels[i])
+        for i, stage_result in succeeded:
+            self._stage_succeeded(stages, i, stage_result, results, outputs, labels[i])
+    
     def _execute_stage(
         self,
         stage: Dict[str, Any],
@@ -457,12 +613,16 @@ class DataPipelineOrchestrator:
 def demo_use_cases():
     """実用的なユースケースのデモ"""
     
+    # 各ユースケースで同じシステムを共有する
+    gc = GenerativeComputingSystem()
+    llm_system = LLMIntegratedSystem(MockLLMProvider())
+    
     # ユースケース1: 研究論文分析
     print("\n" + "="*70)
     print("ユースケース1: 研究論文分析")
     print("="*70)
     
-    analyzer = ResearchPaperAnalyzer()
+    analyzer = ResearchPaperAnalyzer(gc, llm_system)
     
     sample_papers = [
         {
@@ -479,7 +639,7 @@ def demo_use_cases():
         }
     ]
     
-    paper_analysis = analyzer.analyze_papers(sample_papers)
+    paper_analysis = analyzer.analyze_papers(sample_papers, max_workers=3)
     print("\n--- 分析結果 ---")
     print(f"論文数: {paper_analysis['papers_analyzed']}")
     print(f"トップキーワード: {paper_analysis['comparison']['top_keywords']}")
@@ -489,7 +649,7 @@ def demo_use_cases():
     print("ユースケース2: ビジネスレポート生成")
     print("="*70)
     
-    generator = BusinessReportGenerator()
+    generator = BusinessReportGenerator(gc, llm_system)
     
     business_data = {
         "revenue": 10000000,
@@ -510,7 +670,7 @@ def demo_use_cases():
     print("ユースケース3: データパイプライン")
     print("="*70)
     
-    orchestrator = DataPipelineOrchestrator()
+    orchestrator = DataPipelineOrchestrator(gc)
     
     pipeline_config = {
         "input_data": "  Sample Data  with  extra  spaces  ",
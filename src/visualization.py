@@ -7,9 +7,67 @@
 import sys
 sys.path.append('/mnt/user-data/outputs/generative_computing')
 
-from typing import Dict, List, Any, Optional
-from datetime import datetime
-import json
+from typing import TYPE_CHECKING, Deque, Dict, Iterator, List, Any, Optional
+from collections import deque
+
+if TYPE_CHECKING:
+    from datetime import datetime
+
+
+# 各ビューの見出しボックス（末尾の空行まで含めて使い回す）
+_BOX_TOP = "┌" + "─" * 58 + "┐"
+_BOX_BOTTOM = "└" + "─" * 58 + "┘"
+_PLAN_HEADER = (_BOX_TOP, "│" + " " * 18 + "実行計画" + " " * 32 + "│", _BOX_BOTTOM, "")
+_MEMORY_HEADER = (_BOX_TOP, "│" + " " * 20 + "メモリ状態" + " " * 28 + "│", _BOX_BOTTOM, "")
+_COT_HEADER = (_BOX_TOP, "│" + " " * 18 + "連鎖思考" + " " * 32 + "│", _BOX_BOTTOM, "")
+_TIMELINE_HEADER = (_BOX_TOP, "│" + " " * 16 + "実行タイムライン" + " " * 26 + "│", _BOX_BOTTOM, "")
+_REPORT_HEADER = (
+    "╔" + "═" * 58 + "╗",
+    "║" + " " * 15 + "パフォーマンスレポート" + " " * 21 + "║",
+    "╚" + "═" * 58 + "╝",
+    ""
+)
+_DASHBOARD_HEADER = (
+    "",
+    "╔" + "═" * 66 + "╗",
+    "║" + " " * 15 + "生成コンピューティング ダッシュボード" + " " * 13 + "║",
+    "╚" + "═" * 66 + "╝",
+    ""
+)
+
+# PerformanceMonitor がメトリクスごとに保持する生の値の上限
+_METRICS_MAXLEN = 10_000
+
+# タイムラインのアクションアイコン
+_ACTION_ICONS = {
+    'allocate_slot': '🔵',
+    'update_slot': '🔄',
+    'delete_slot': '🗑',
+    'transform_slot': '⚡',
+    'create_checkpoint': '💾',
+    'restore_checkpoint': '⏮'
+}
+
+# 実行計画の1タスク分のボックス（入力行は入力スロットがある場合のみ）
+_PLAN_TASK_BOX = (
+    "  [{idx}] {task_id}\n"
+    "  ┌" + "─" * 50 + "┐\n"
+    "  │ Type: {task_type:<43}│\n"
+    "  │ Desc: {description:<42}│\n"
+    "{input_line}"
+    "  │ Output: {outputs:<41}│\n"
+    "  └" + "─" * 50 + "┘"
+)
+_PLAN_INPUT_LINE = "  │ Input: {:<42}│\n"
+_PLAN_ARROW = "       │\n       ↓"
+
+# 連鎖思考の1ステップ分
+_COT_STEP = (
+    "{marker} Step {step_id}\n"
+    "  ├─ {description}\n"
+    "  ├─ 信頼度: [{conf_bar}] {confidence:.2f}\n"
+    "  └─{checkpoint}"
+)
 
 
 class ExecutionVisualizer:
@@ -24,37 +82,31 @@ class ExecutionVisualizer:
     
     def visualize_execution_plan(self, plan) -> str:
         """実行計画をASCIIアートで可視化"""
-        lines = []
-        lines.append("┌" + "─" * 58 + "┐")
-        lines.append("│" + " " * 18 + "実行計画" + " " * 32 + "│")
-        lines.append("└" + "─" * 58 + "┘")
-        lines.append("")
-        
-        task_dict = {t.task_id: t for t in plan.tasks}
+        lines = list(_PLAN_HEADER)
         
         for idx, task_id in enumerate(plan.execution_order, 1):
-            task = task_dict[task_id]
-            
-            # タスクボックス
-            lines.append(f"  [{idx}] {task.task_id}")
-            lines.append(f"  ┌{'─' * 50}┐")
-            lines.append(f"  │ Type: {task.task_type.value:<43}│")
-            lines.append(f"  │ Desc: {task.description[:42]:<42}│")
+            task = plan.task_index[task_id]
             
+            input_line = ""
             if task.input_slots:
                 inputs = ", ".join(task.input_slots[:2])
                 if len(task.input_slots) > 2:
                     inputs += "..."
-                lines.append(f"  │ Input: {inputs:<42}│")
+                input_line = _PLAN_INPUT_LINE.format(inputs)
             
-            outputs = ", ".join(task.output_slots[:2])
-            lines.append(f"  │ Output: {outputs:<41}│")
-            lines.append(f"  └{'─' * 50}┘")
+            # タスクボックス
+            lines.append(_PLAN_TASK_BOX.format(
+                idx=idx,
+                task_id=task.task_id,
+                task_type=task.task_type.value,
+                description=task.description[:42],
+                input_line=input_line,
+                outputs=", ".join(task.output_slots[:2])
+            ))
             
             # 依存関係の矢印
             if idx < len(plan.execution_order):
-                lines.append("       │")
-                lines.append("       ↓")
+                lines.append(_PLAN_ARROW)
             
             lines.append("")
         
@@ -62,13 +114,13 @@ class ExecutionVisualizer:
     
     def visualize_memory_state(self, runtime) -> str:
         """メモリ状態を可視化"""
-        usage = runtime.get_memory_usage()
+        return self.render_memory_state(runtime.snapshot(history_n=0))
+    
+    def render_memory_state(self, snapshot) -> str:
+        """RuntimeSnapshot からメモリ状態を描画"""
+        usage = snapshot.memory_usage
         
-        lines = []
-        lines.append("┌" + "─" * 58 + "┐")
-        lines.append("│" + " " * 20 + "メモリ状態" + " " * 28 + "│")
-        lines.append("└" + "─" * 58 + "┘")
-        lines.append("")
+        lines = list(_MEMORY_HEADER)
         
         lines.append(f"  総スロット数: {usage['total_slots']}")
         lines.append(f"  チェックポイント数: {usage['checkpoints']}")
@@ -87,8 +139,7 @@ class ExecutionVisualizer:
         
         # 最近のスロット
         lines.append("  最近のスロット:")
-        recent_slots = list(runtime.memory_slots.values())[-3:]
-        for slot in recent_slots:
+        for slot in snapshot.recent_slots:
             content_preview = str(slot.content)[:30]
             lines.append(f"    • {slot.slot_id}: {content_preview}...")
         
@@ -96,29 +147,22 @@ class ExecutionVisualizer:
     
     def visualize_cot(self, cot) -> str:
         """CoT（連鎖思考）を可視化"""
-        lines = []
-        lines.append("┌" + "─" * 58 + "┐")
-        lines.append("│" + " " * 18 + "連鎖思考" + " " * 32 + "│")
-        lines.append("└" + "─" * 58 + "┘")
-        lines.append("")
+        lines = list(_COT_HEADER)
         
         for step in cot.thought_chain:
             is_current = step.step_id == cot.current_step
-            marker = "►" if is_current else " "
             
             # 信頼度バー
             conf_level = int(step.confidence * 10)
-            conf_bar = "●" * conf_level + "○" * (10 - conf_level)
-            
-            lines.append(f"{marker} Step {step.step_id}")
-            lines.append(f"  ├─ {step.description}")
-            lines.append(f"  ├─ 信頼度: [{conf_bar}] {step.confidence:.2f}")
-            
-            if step.checkpoint_id:
-                lines.append(f"  └─ CP: {step.checkpoint_id}")
-            else:
-                lines.append(f"  └─")
             
+            lines.append(_COT_STEP.format(
+                marker="►" if is_current else " ",
+                step_id=step.step_id,
+                description=step.description,
+                conf_bar="●" * conf_level + "○" * (10 - conf_level),
+                confidence=step.confidence,
+                checkpoint=f" CP: {step.checkpoint_id}" if step.checkpoint_id else ""
+            ))
             lines.append("")
         
         # 低信頼度の警告
@@ -130,31 +174,23 @@ class ExecutionVisualizer:
         
         return "\n".join(lines)
     
-    def create_timeline(self, execution_history: List[Dict]) -> str:
-        """実行履歴のタイムラインを作成"""
-        lines = []
-        lines.append("┌" + "─" * 58 + "┐")
-        lines.append("│" + " " * 16 + "実行タイムライン" + " " * 26 + "│")
-        lines.append("└" + "─" * 58 + "┘")
-        lines.append("")
+    def create_timeline(self, runtime, n: int = 10) -> str:
+        """実行履歴のタイムラインを作成（直近 n 件）"""
+        return self.render_timeline(runtime.recent_history(n))
+    
+    def render_timeline(self, recent: List[Dict]) -> str:
+        """直近の実行履歴（古い順）からタイムラインを描画"""
+        lines = list(_TIMELINE_HEADER)
         
-        if not execution_history:
+        if not recent:
             lines.append("  実行履歴なし")
             return "\n".join(lines)
         
-        for i, action in enumerate(execution_history[-10:], 1):  # 最新10件
+        for i, action in enumerate(recent, 1):
             action_name = action.get('action', 'unknown')
             timestamp = action.get('timestamp', '')
             
-            # アクションアイコン
-            icon = {
-                'allocate_slot': '🔵',
-                'update_slot': '🔄',
-                'delete_slot': '🗑',
-                'transform_slot': '⚡',
-                'create_checkpoint': '💾',
-                'restore_checkpoint': '⏮'
-            }.get(action_name, '•')
+            icon = _ACTION_ICONS.get(action_name, '•')
             
             lines.append(f"  {i:2}. {icon} {action_name}")
             
@@ -173,17 +209,27 @@ class PerformanceMonitor:
     システムの性能を追跡・分析
     """
     
-    def __init__(self):
-        self.metrics: Dict[str, List[float]] = {
-            'execution_time': [],
-            'memory_usage': [],
-            'task_count': [],
-            'llm_calls': []
+    def __init__(self, capacity: int = _METRICS_MAXLEN):
+        """
+        Args:
+            capacity: メトリクスごとに保持する生の値の上限（古いものから捨てる。統計は全期間）
+        """
+        self.metrics: Dict[str, Deque[float]] = {
+            'execution_time': deque(maxlen=capacity),
+            'memory_usage': deque(maxlen=capacity),
+            'task_count': deque(maxlen=capacity),
+            'llm_calls': deque(maxlen=capacity)
+        }
+        # メトリクスごとの集計値 [件数, 最小, 最大, 合計]（記録時に更新し、統計取得で再走査しない）
+        self._aggregates: Dict[str, List[float]] = {
+            metric_name: [0, 0, 0, 0] for metric_name in self.metrics
         }
-        self.start_time: Optional[datetime] = None
+        self.start_time: Optional["datetime"] = None
     
     def start_monitoring(self):
         """モニタリング開始"""
+        from datetime import datetime
+        
         self.start_time = datetime.now()
     
     def record_execution(
@@ -194,23 +240,35 @@ class PerformanceMonitor:
         llm_calls: int = 0
     ):
         """実行メトリクスを記録"""
-        self.metrics['execution_time'].append(execution_time)
-        self.metrics['memory_usage'].append(memory_slots)
-        self.metrics['task_count'].append(task_count)
-        self.metrics['llm_calls'].append(llm_calls)
+        self._record('execution_time', execution_time)
+        self._record('memory_usage', memory_slots)
+        self._record('task_count', task_count)
+        self._record('llm_calls', llm_calls)
+    
+    def _record(self, metric_name: str, value: float) -> None:
+        """値を追加し、集計値を更新"""
+        self.metrics[metric_name].append(value)
+        aggregate = self._aggregates[metric_name]
+        if aggregate[0]:
+            aggregate[1] = min(aggregate[1], value)
+            aggregate[2] = max(aggregate[2], value)
+        else:
+            aggregate[1] = aggregate[2] = value
+        aggregate[0] += 1
+        aggregate[3] += value
     
     def get_statistics(self) -> Dict[str, Any]:
         """統計情報を取得"""
         stats = {}
         
-        for metric_name, values in self.metrics.items():
-            if values:
+        for metric_name, (count, minimum, maximum, total) in self._aggregates.items():
+            if count:
                 stats[metric_name] = {
-                    'count': len(values),
-                    'min': min(values),
-                    'max': max(values),
-                    'avg': sum(values) / len(values),
-                    'total': sum(values)
+                    'count': count,
+                    'min': minimum,
+                    'max': maximum,
+                    'avg': total / count,
+                    'total': total
                 }
             else:
                 stats[metric_name] = {
@@ -227,11 +285,7 @@ class PerformanceMonitor:
         """パフォーマンスレポートを生成"""
         stats = self.get_statistics()
         
-        lines = []
-        lines.append("╔" + "═" * 58 + "╗")
-        lines.append("║" + " " * 15 + "パフォーマンスレポート" + " " * 21 + "║")
-        lines.append("╚" + "═" * 58 + "╝")
-        lines.append("")
+        lines = list(_REPORT_HEADER)
         
         # 実行時間
         exec_stats = stats['execution_time']
@@ -297,50 +351,48 @@ class DashboardGenerator:
             gc_system: GenerativeComputingSystemインスタンス
             include_sections: 含めるセクション（Noneで全て）
         """
+        return "\n".join(self.iter_dashboard_lines(gc_system, include_sections))
+    
+    def iter_dashboard_lines(
+        self,
+        gc_system,
+        include_sections: Optional[List[str]] = None
+    ) -> Iterator[str]:
+        """ダッシュボードを行（またはセクション）単位で順に生成（改行で連結すると generate_dashboard と同じ）"""
         all_sections = ['header', 'system', 'memory', 'history', 'performance']
         sections = include_sections or all_sections
         
-        lines = []
-        
         # ヘッダー
         if 'header' in sections:
-            lines.append("")
-            lines.append("╔" + "═" * 66 + "╗")
-            lines.append("║" + " " * 15 + "生成コンピューティング ダッシュボード" + " " * 13 + "║")
-            lines.append("╚" + "═" * 66 + "╝")
-            lines.append("")
+            yield from _DASHBOARD_HEADER
+        
+        # ランタイムの状態は各セクションで使い回すため一度だけ取得する
+        snapshot = gc_system.runtime.snapshot()
         
         # システム状態
         if 'system' in sections:
-            status = gc_system.get_system_status()
-            lines.append("┌─ システム状態 " + "─" * 50 + "┐")
-            lines.append(f"│ セッションID: {status['session_id']:<43}│")
-            lines.append(f"│ 実行履歴: {status['runtime']['execution_history_length']}件{' ' * 45}│")
-            lines.append(f"│ 利用可能関数: {status['function_library']['available_functions']}個{' ' * 42}│")
-            lines.append("└" + "─" * 66 + "┘")
-            lines.append("")
+            available_functions = len(gc_system.function_library.functions)
+            yield "┌─ システム状態 " + "─" * 50 + "┐"
+            yield f"│ セッションID: {gc_system.session_id:<43}│"
+            yield f"│ 実行履歴: {snapshot.execution_history_length}件{' ' * 45}│"
+            yield f"│ 利用可能関数: {available_functions}個{' ' * 42}│"
+            yield "└" + "─" * 66 + "┘"
+            yield ""
         
         # メモリ状態
         if 'memory' in sections:
-            memory_viz = self.visualizer.visualize_memory_state(gc_system.runtime)
-            lines.append(memory_viz)
-            lines.append("")
+            yield self.visualizer.render_memory_state(snapshot)
+            yield ""
         
         # 実行履歴
         if 'history' in sections:
-            timeline = self.visualizer.create_timeline(
-                gc_system.runtime.execution_history
-            )
-            lines.append(timeline)
-            lines.append("")
+            yield self.visualizer.render_timeline(snapshot.recent_history)
+            yield ""
         
         # パフォーマンス
         if 'performance' in sections and self.monitor.metrics['execution_time']:
-            perf_report = self.monitor.generate_report()
-            lines.append(perf_report)
-            lines.append("")
-        
-        return "\n".join(lines)
+            yield self.monitor.generate_report()
+            yield ""
     
     def export_dashboard(
         self,
@@ -349,13 +401,19 @@ class DashboardGenerator:
         format: str = 'txt'
     ):
         """ダッシュボードをファイルにエクスポート"""
-        dashboard = self.generate_dashboard(gc_system)
-        
         if format == 'txt':
+            # 全体を1つの文字列にせず、生成した順にファイルへ書き出す
             with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(dashboard)
+                for idx, line in enumerate(self.iter_dashboard_lines(gc_system)):
+                    if idx:
+                        f.write("\n")
+                    f.write(line)
         
         elif format == 'json':
+            # JSON 出力時にしか使わないので、テキスト用途ではインポートしない
+            from datetime import datetime
+            import json
+            
             data = {
                 'session_id': gc_system.session_id,
                 'timestamp': datetime.now().isoformat(),